@@ -1,12 +1,18 @@
+import time
+import uuid
 from abc import ABC, abstractmethod
 from contextlib import asynccontextmanager
+from itertools import islice
 from typing import List, Optional
 
 from pydantic import BaseModel, Field, model_validator
 
+from app.compaction import MemoryCompactor
+from app.ledger import UsageLedger, ledger_scope
 from app.llm import LLM
 from app.logger import logger
-from app.schema import AgentState, Memory, Message, ROLE_TYPE
+from app.memory_store import MemoryStore
+from app.schema import ROLE_TYPE, AgentState, Memory, Message
 
 
 class BaseAgent(BaseModel, ABC):
@@ -31,6 +37,18 @@ class BaseAgent(BaseModel, ABC):
     # Dependencies
     llm: LLM = Field(default_factory=LLM, description="Language model instance")
     memory: Memory = Field(default_factory=Memory, description="Agent's memory store")
+    session_id: Optional[str] = Field(
+        None,
+        description="Names the durable transcript of memory; an existing one is resumed",
+    )
+    ledger: UsageLedger = Field(
+        default_factory=UsageLedger.from_config,
+        description="Token and cost usage of the current run, with its budgets",
+    )
+    compactor: MemoryCompactor = Field(
+        default_factory=MemoryCompactor.from_config,
+        description="Folds older history into a rolling summary between steps",
+    )
     state: AgentState = Field(
         default=AgentState.IDLE, description="Current agent state"
     )
@@ -52,8 +70,35 @@ class BaseAgent(BaseModel, ABC):
             self.llm = LLM(config_name=self.name.lower())
         if not isinstance(self.memory, Memory):
             self.memory = Memory()
+        if self.memory.store is None:
+            self._open_memory_store()
+        self.ledger.name = self.name
+        # Load the model while the caller is still setting up the run
+        self.llm.start_warmup()
         return self
 
+    def _open_memory_store(self) -> None:
+        """Persist memory to the session's transcript when [memory] store_directory is set."""
+        session_id = self.session_id or (
+            f"{self.name.lower()}-{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        )
+        store = MemoryStore.for_session(session_id)
+        if store is None:
+            return
+        self.session_id = session_id
+        if len(store):
+            self.memory = Memory.from_store(
+                store,
+                max_messages=self.memory.max_messages,
+                max_tokens=self.memory.max_tokens,
+            )
+            logger.info(
+                f"Resumed session '{session_id}': {len(self.memory.messages)} messages "
+                f"in memory from {len(store)} transcript records"
+            )
+        else:
+            self.memory.attach(store)
+
     @asynccontextmanager
     async def state_context(self, new_state: AgentState):
         """Context manager for safe agent state transitions.
@@ -82,7 +127,7 @@ class BaseAgent(BaseModel, ABC):
 
     def update_memory(
         self,
-        role: ROLE_TYPE, # type: ignore
+        role: ROLE_TYPE,  # type: ignore
         content: str,
         **kwargs,
     ) -> None:
@@ -129,24 +174,41 @@ class BaseAgent(BaseModel, ABC):
             self.update_memory("user", request)
 
         results: List[str] = []
-        async with self.state_context(AgentState.RUNNING):
-            while (
-                self.current_step < self.max_steps and self.state != AgentState.FINISHED
-            ):
-                self.current_step += 1
-                logger.info(f"Executing step {self.current_step}/{self.max_steps}")
-                step_result = await self.step()
-
-                # Check for stuck state
-                if self.is_stuck():
-                    self.handle_stuck_state()
-
-                results.append(f"Step {self.current_step}: {step_result}")
-
-            if self.current_step >= self.max_steps:
-                self.current_step = 0
-                self.state = AgentState.IDLE
-                results.append(f"Terminated: Reached max steps ({self.max_steps})")
+        self.ledger.reset()
+        with ledger_scope(self.ledger):
+            async with self.state_context(AgentState.RUNNING):
+                while (
+                    self.current_step < self.max_steps
+                    and self.state != AgentState.FINISHED
+                ):
+                    self.current_step += 1
+                    self.ledger.step = self.current_step
+                    # Adopt a summary finished since the last step; never wait for one
+                    self.compactor.apply(self.memory)
+                    logger.info(f"Executing step {self.current_step}/{self.max_steps}")
+                    step_result = await self.step()
+                    self.compactor.schedule(self.memory)
+
+                    # Check for stuck state
+                    if self.is_stuck():
+                        self.handle_stuck_state()
+
+                    results.append(f"Step {self.current_step}: {step_result}")
+
+                    # Stop gracefully once this run (or its flow) is out of budget
+                    exhausted = self.ledger.exhausted
+                    if exhausted:
+                        logger.warning(f"Budget exhausted: {exhausted}")
+                        self.state = AgentState.FINISHED
+                        results.append(f"Terminated: Budget exhausted ({exhausted})")
+
+                if self.current_step >= self.max_steps:
+                    self.current_step = 0
+                    self.state = AgentState.IDLE
+                    results.append(f"Terminated: Reached max steps ({self.max_steps})")
+
+            self.compactor.cancel()
+            logger.info(self.ledger.format_report())
 
         return "\n".join(results) if results else "No steps executed"
 
@@ -176,7 +238,7 @@ class BaseAgent(BaseModel, ABC):
         # Count identical content occurrences
         duplicate_count = sum(
             1
-            for msg in reversed(self.memory.messages[:-1])
+            for msg in islice(reversed(self.memory.messages), 1, None)
             if msg.role == "assistant" and msg.content == last_message.content
         )
 
@@ -184,10 +246,14 @@ class BaseAgent(BaseModel, ABC):
 
     @property
     def messages(self) -> List[Message]:
-        """Retrieve a list of messages from the agent's memory."""
-        return self.memory.messages
+        """A list snapshot of the messages in the agent's memory.
+
+        Use ``memory.add_message`` to add messages; appending to the snapshot
+        does not change memory.
+        """
+        return list(self.memory.messages)
 
     @messages.setter
     def messages(self, value: List[Message]):
-        """Set the list of messages in the agent's memory."""
-        self.memory.messages = value
+        """Replace the messages in the agent's memory, within its limits."""
+        self.memory.replace(value)
@@ -1,13 +1,17 @@
+import json
 import time
+import uuid
 from typing import Dict, List, Optional
 
+from openai import OpenAIError
 from pydantic import Field, model_validator
 
 from app.agent.toolcall import ToolCallAgent
 from app.logger import logger
 from app.prompt.planning import NEXT_STEP_PROMPT, PLANNING_SYSTEM_PROMPT
-from app.schema import Message, TOOL_CHOICE_TYPE, ToolCall, ToolChoice
+from app.schema import TOOL_CHOICE_TYPE, Function, Message, ToolCall, ToolChoice
 from app.tool import PlanningTool, Terminate, ToolCollection
+from app.tool.planning import PLAN_SCHEMA
 
 
 class PlanningAgent(ToolCallAgent):
@@ -27,7 +31,7 @@ class PlanningAgent(ToolCallAgent):
     available_tools: ToolCollection = Field(
         default_factory=lambda: ToolCollection(PlanningTool(), Terminate())
     )
-    tool_choices: TOOL_CHOICE_TYPE = ToolChoice.AUTO # type: ignore
+    tool_choices: TOOL_CHOICE_TYPE = ToolChoice.AUTO  # type: ignore
     special_tool_names: List[str] = Field(default_factory=lambda: [Terminate().name])
 
     tool_calls: List[ToolCall] = Field(default_factory=list)
@@ -56,7 +60,7 @@ class PlanningAgent(ToolCallAgent):
             if self.active_plan_id
             else self.next_step_prompt
         )
-        self.messages.append(Message.user_message(prompt))
+        self.memory.add_message(Message.user_message(prompt))
 
         # Get the current step index before thinking
         self.current_step_index = await self._get_current_step_index()
@@ -208,20 +212,55 @@ class PlanningAgent(ToolCallAgent):
             )
         ]
         self.memory.add_messages(messages)
-        response = await self.llm.ask_tool(
-            messages=messages,
-            system_msgs=[Message.system_message(self.system_prompt)],
-            tools=self.available_tools.to_params(),
-            tool_choice=ToolChoice.REQUIRED,
-        )
-        assistant_msg = Message.from_tool_calls(
-            content=response.content, tool_calls=response.tool_calls
-        )
+        system_msgs = [Message.system_message(self.system_prompt)]
+
+        content, tool_calls = "", None
+        if (
+            self.llm.supports_structured_output
+            and "planning" in self.available_tools.tool_map
+        ):
+            try:
+                plan = await self.llm.ask_json(
+                    messages=messages,
+                    system_msgs=system_msgs,
+                    schema=PLAN_SCHEMA,
+                    name="plan",
+                )
+            except (ValueError, OpenAIError) as e:
+                logger.warning(
+                    f"Structured plan creation failed, using the planning tool: {e}"
+                )
+            else:
+                # Store the plan as the planning call it replaces, so memory reads the same
+                arguments = {
+                    "command": "create",
+                    "plan_id": self.active_plan_id,
+                    **plan,
+                }
+                tool_calls = [
+                    ToolCall(
+                        id=f"call_{uuid.uuid4().hex[:24]}",
+                        function=Function(
+                            name="planning", arguments=json.dumps(arguments)
+                        ),
+                    )
+                ]
+
+        if tool_calls is None:
+            response = await self.llm.ask_tool(
+                messages=messages,
+                system_msgs=system_msgs,
+                tools=self.available_tools.to_params(),
+                tool_choice=ToolChoice.REQUIRED,
+            )
+            content, tool_calls = response.content, response.tool_calls or []
+
+        assistant_msg = Message.from_tool_calls(content=content, tool_calls=tool_calls)
 
         self.memory.add_message(assistant_msg)
 
         plan_created = False
-        for tool_call in response.tool_calls:
+        for tool_call in tool_calls:
             if tool_call.function.name == "planning":
                 result = await self.execute_tool(tool_call)
                 logger.info(
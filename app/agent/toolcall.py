@@ -1,14 +1,19 @@
+import asyncio
 import json
+from typing import Any, Dict, List, Literal, Optional, Union
 
-from typing import Any, List, Literal, Optional, Union
-
-from pydantic import Field
+from pydantic import Field, model_validator
 
 from app.agent.react import ReActAgent
+from app.blob_store import get_blob_store
+from app.config import config
+from app.ledger import tool_scope
 from app.logger import logger
 from app.prompt.toolcall import NEXT_STEP_PROMPT, SYSTEM_PROMPT
-from app.schema import AgentState, Message, ToolCall, TOOL_CHOICE_TYPE, ToolChoice
-from app.tool import CreateChatCompletion, Terminate, ToolCollection
+from app.schema import TOOL_CHOICE_TYPE, AgentState, Message, ToolCall, ToolChoice
+from app.tool import CreateChatCompletion, ReadBlob, Terminate, ToolCollection
+
+
 # from app.tool.end_game import EndGame
 
 TOOL_CALL_REQUIRED = "Tool calls required but none provided"
@@ -26,25 +31,75 @@ class ToolCallAgent(ReActAgent):
     available_tools: ToolCollection = ToolCollection(
         CreateChatCompletion(), Terminate()
     )
-    tool_choices: TOOL_CHOICE_TYPE = ToolChoice.AUTO # type: ignore
+    tool_choices: TOOL_CHOICE_TYPE = ToolChoice.AUTO  # type: ignore
     special_tool_names: List[str] = Field(default_factory=lambda: [Terminate().name])
 
     tool_calls: List[ToolCall] = Field(default_factory=list)
 
-
     max_steps: int = 60
 
     max_observe: Optional[Union[int, bool]] = None
 
+    # Send next_step_prompt as the last message of each request without storing it
+    # in memory, so the history before it stays byte-stable for prefix caching
+    volatile_next_step_prompt: bool = False
+
+    # Stream completions and start each tool as soon as its arguments are complete
+    stream_tool_calls: bool = False
+    pending_tool_results: Dict[str, asyncio.Task] = Field(
+        default_factory=dict, exclude=True
+    )
+
+    @model_validator(mode="after")
+    def _offer_read_blob(self) -> "ToolCallAgent":
+        """Add read_blob when large observations are stored as blobs."""
+        if (
+            get_blob_store() is not None
+            and "read_blob" not in self.available_tools.tool_map
+        ):
+            # A new collection: the class default is shared by every instance
+            self.available_tools = ToolCollection(
+                *self.available_tools.tools, ReadBlob()
+            )
+        return self
+
+    def _dispatch_tool_call(self, command: ToolCall) -> None:
+        """Start a streamed tool call, chained after the previously dispatched one."""
+        previous = next(reversed(self.pending_tool_results.values()), None)
+
+        async def run_in_order() -> str:
+            if previous is not None:
+                await asyncio.wait([previous])
+            return await self.execute_tool(command)
+
+        logger.info(
+            f"⚡ Dispatching tool '{command.function.name}' while the model is still responding"
+        )
+        self.pending_tool_results[command.id] = asyncio.create_task(run_in_order())
+
+    def _cancel_pending_tool_calls(self) -> None:
+        for task in self.pending_tool_results.values():
+            task.cancel()
+        self.pending_tool_results = {}
+
     async def think(self) -> bool:
         """Process current state and decide next actions using tools"""
+        self._cancel_pending_tool_calls()
+        # Stable prefix first (system prompt, tools, history); volatile content last
+        messages = self.messages
         if self.next_step_prompt:
             user_msg = Message.user_message(self.next_step_prompt)
-            self.messages += [user_msg]
+            if self.volatile_next_step_prompt:
+                messages = messages + [user_msg]
+            else:
+                self.memory.add_message(user_msg)
+                messages = self.messages
 
         # Log parameter values
-        system_msgs = [Message.system_message(self.system_prompt)] if self.system_prompt else None
-        tools = self.available_tools.to_params()        
+        system_msgs = (
+            [Message.system_message(self.system_prompt)] if self.system_prompt else None
+        )
+        tools = self.available_tools.to_params()
         # logger.info("-"*100)
         # logger.info(f"📝 {self.name} parameters for self.llm.ask_tool()")
         # logger.info(f"📝 {self.name} parameter info: messages count={len(self.messages)}")
@@ -53,14 +108,26 @@ class ToolCallAgent(ReActAgent):
         # logger.info(f"📝 {self.name} parameter info: tool_choice={self.tool_choices}")
         # logger.info("-"*100)
         # Get response with tool options
-        response = await self.llm.ask_tool(
-            messages=self.messages,
-            system_msgs=[Message.system_message(self.system_prompt)]
-            if self.system_prompt
-            else None,
-            tools=self.available_tools.to_params(),
-            tool_choice=self.tool_choices,
-        )
+        if self.stream_tool_calls and self.tool_choices != ToolChoice.NONE:
+            try:
+                response = await self.llm.ask_tool_stream(
+                    messages=messages,
+                    system_msgs=system_msgs,
+                    tools=tools,
+                    tool_choice=self.tool_choices,
+                    on_tool_call=self._dispatch_tool_call,
+                )
+            except BaseException:
+                # Tool calls dispatched before the failure must not keep running unowned
+                self._cancel_pending_tool_calls()
+                raise
+        else:
+            response = await self.llm.ask_tool(
+                messages=messages,
+                system_msgs=system_msgs,
+                tools=tools,
+                tool_choice=self.tool_choices,
+            )
         self.tool_calls = response.tool_calls
 
         # Log response info
@@ -78,8 +145,12 @@ class ToolCallAgent(ReActAgent):
             logger.info(
                 f"🧰 Tools being prepared: {[call.function.name for call in response.tool_calls]}"
             )
-            if "end_game" in [call.function.name for call in response.tool_calls] and len(response.tool_calls) == 1:
+            if (
+                "end_game" in [call.function.name for call in response.tool_calls]
+                and len(response.tool_calls) == 1
+            ):
                 logger.info(f"🏁 Special tool 'EndGame' has completed the task!")
+                self._cancel_pending_tool_calls()
                 self.state = AgentState.FINISHED
                 return False
 
@@ -129,11 +200,19 @@ class ToolCallAgent(ReActAgent):
                 raise ValueError(TOOL_CALL_REQUIRED)
 
             # Return last message content if no tool calls
-            return self.messages[-1].content or "No content or commands to execute"
+            return (
+                self.memory.messages[-1].content or "No content or commands to execute"
+            )
 
         results = []
         for command in self.tool_calls:
-            result = await self.execute_tool(command)
+            pending = self.pending_tool_results.pop(command.id, None)
+            result = await pending if pending else await self.execute_tool(command)
+
+            # Keep large outputs on disk and only a preview with their handle in memory
+            blob_store = get_blob_store()
+            if blob_store is not None and command.function.name != "read_blob":
+                result = blob_store.externalize(result, config.blobs.threshold_chars)
 
             if self.max_observe:
                 result = result[: self.max_observe]
@@ -166,7 +245,8 @@ class ToolCallAgent(ReActAgent):
 
             # Execute the tool
             logger.info(f"🔧 Activating tool: '{name}'...")
-            result = await self.available_tools.execute(name=name, tool_input=args)
+            with tool_scope(name):
+                result = await self.available_tools.execute(name=name, tool_input=args)
 
             # Format result for display
             observation = (
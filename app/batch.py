@@ -0,0 +1,72 @@
+"""Bounded-concurrency fan-out of independent coroutines."""
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, Optional
+
+from pydantic import BaseModel
+
+
+class BatchResult(BaseModel):
+    """Outcome of one item of a batch: its result, or the error it raised."""
+
+    index: int
+    result: Any = None
+    error: Optional[BaseException] = None
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+async def run_bounded(
+    calls: Iterable[Callable[[], Awaitable[Any]]], concurrency: int
+) -> AsyncIterator[BatchResult]:
+    """
+    Run calls with at most concurrency in flight, yielding results as they finish.
+
+    A failing call yields a BatchResult carrying its exception and does not
+    affect the others. Closing the generator early cancels the calls still
+    running.
+
+    Args:
+        calls: Zero-argument callables returning awaitables, started in order
+        concurrency: Maximum number of calls in flight
+
+    Yields:
+        BatchResult: One per call, in completion order, indexed by call position
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+
+    pending_calls = iter(enumerate(calls))
+    running: dict = {}
+
+    def start_next() -> bool:
+        item = next(pending_calls, None)
+        if item is None:
+            return False
+        index, call = item
+        running[asyncio.ensure_future(call())] = index
+        return True
+
+    try:
+        while len(running) < concurrency and start_next():
+            pass
+        while running:
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                index = running.pop(task)
+                if task.cancelled():
+                    yield BatchResult(index=index, error=asyncio.CancelledError())
+                elif task.exception() is not None:
+                    yield BatchResult(index=index, error=task.exception())
+                else:
+                    yield BatchResult(index=index, result=task.result())
+                start_next()
+    finally:
+        for task in running:
+            task.cancel()
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
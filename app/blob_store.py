@@ -0,0 +1,135 @@
+"""Content-addressed storage for large tool observations."""
+import hashlib
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Optional, Tuple
+
+from app.config import PROJECT_ROOT, BlobSettings, config
+from app.logger import logger
+
+
+_HANDLE_PATTERN = re.compile(r"^[0-9a-f]{16}$")
+
+
+class BlobStore:
+    """Stores text on disk under a handle derived from its SHA-256.
+
+    Identical observations share one file, and a file never changes once
+    written, so handles stay valid for the lifetime of the directory.
+    """
+
+    def __init__(
+        self, directory: Path, preview_chars: int = 2000, max_read_chars: int = 20000
+    ):
+        self.directory = Path(directory)
+        self.preview_chars = preview_chars
+        self.max_read_chars = max_read_chars
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def from_settings(cls, settings: BlobSettings) -> "BlobStore":
+        directory = Path(settings.directory)
+        if not directory.is_absolute():
+            directory = PROJECT_ROOT / directory
+        return cls(directory, settings.preview_chars, settings.max_read_chars)
+
+    def _path(self, handle: str) -> Path:
+        if not _HANDLE_PATTERN.match(handle):
+            raise ValueError(f"Invalid blob handle: {handle!r}")
+        return self.directory / handle[:2] / handle
+
+    def put(self, text: str) -> str:
+        """Store text and return its handle."""
+        data = text.encode("utf-8")
+        handle = hashlib.sha256(data).hexdigest()[:16]
+        path = self._path(handle)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write then rename so readers never see a partial blob
+            fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        return handle
+
+    def exists(self, handle: str) -> bool:
+        return self._path(handle).exists()
+
+    def stat(self, handle: str) -> Tuple[int, int]:
+        """(size in bytes, number of lines) of a blob."""
+        size = 0
+        lines = 0
+        with open(self._path(handle), "rb") as f:
+            for line in f:
+                size += len(line)
+                lines += 1
+        return size, lines
+
+    def read_bytes(self, handle: str, start: int = 0, end: Optional[int] = None) -> str:
+        """Bytes start..end of a blob, decoded; a split character at either edge is replaced."""
+        with open(self._path(handle), "rb") as f:
+            f.seek(max(start, 0))
+            length = None if end is None else max(end - max(start, 0), 0)
+            data = f.read(-1 if length is None else length)
+        return data.decode("utf-8", errors="replace")
+
+    def read_lines(self, handle: str, start: int = 1, end: Optional[int] = None) -> str:
+        """Lines start..end (1-based, inclusive) of a blob."""
+        selected = []
+        with open(self._path(handle), "r", encoding="utf-8", errors="replace") as f:
+            for number, line in enumerate(f, 1):
+                if end is not None and number > end:
+                    break
+                if number >= start:
+                    selected.append(line)
+        return "".join(selected)
+
+    def preview(self, text: str, handle: str) -> str:
+        """
+        What memory keeps of a stored observation: a header with the handle,
+        then its head and tail.
+
+        The header comes first so that truncating the preview keeps the handle.
+        """
+        head_chars = self.preview_chars * 3 // 4
+        tail_chars = self.preview_chars - head_chars
+        size = len(text.encode("utf-8"))
+        lines = len(text.splitlines())
+        header = (
+            f"[Output of {size} bytes, {lines} lines stored as blob {handle}. "
+            f"Showing the first {head_chars} and last {tail_chars} characters; "
+            f"call read_blob with handle '{handle}' and a line or byte range for the rest.]"
+        )
+        return f"{header}\n{text[:head_chars]}\n...[omitted]...\n{text[-tail_chars:]}"
+
+    def externalize(self, text: str, threshold: int) -> str:
+        """Store text as a blob and return its preview, if it is longer than threshold."""
+        if len(text) <= max(threshold, self.preview_chars):
+            return text
+        try:
+            handle = self.put(text)
+        except OSError as e:
+            logger.warning(f"Could not store a large observation as a blob: {e}")
+            return text
+        return self.preview(text, handle)
+
+
+_blob_store: Optional[BlobStore] = None
+
+
+def get_blob_store() -> Optional[BlobStore]:
+    """
+    Get the process-wide blob store.
+
+    Returns:
+        The shared BlobStore, or None if blobs are disabled in config
+    """
+    global _blob_store
+    if _blob_store is None and config.blobs.threshold_chars is not None:
+        _blob_store = BlobStore.from_settings(config.blobs)
+        logger.info(
+            f"Large tool observations are stored as blobs in {_blob_store.directory}"
+        )
+    return _blob_store
@@ -0,0 +1,233 @@
+"""Content-addressed on-disk cache for LLM responses."""
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.config import PROJECT_ROOT, CacheSettings, config
+from app.logger import logger
+
+
+class ResponseCache:
+    """A persistent cache mapping normalized LLM requests to their responses.
+
+    Each entry is stored as one JSON file named after the SHA-256 of the
+    canonical request, so identical requests share an entry across processes.
+    Entries older than ``ttl_seconds`` are dropped on read, and the least
+    recently used entries are evicted once the entry count or total size
+    exceeds its limits.
+
+    The directory is scanned once; after that entry sizes and recency are
+    tracked in memory. Async callers use ``aget`` and ``aset``, which do the
+    disk work in a worker thread instead of on the event loop.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        max_entries: int = 10000,
+        max_size_bytes: int = 512 * 1024 * 1024,
+        ttl_seconds: Optional[float] = None,
+    ):
+        self.directory = Path(directory)
+        self.max_entries = max_entries
+        self.max_size_bytes = max_size_bytes
+        self.ttl_seconds = ttl_seconds
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        # path -> size in bytes, least recently used first; loaded lazily from disk
+        self._index: Optional["OrderedDict[Path, int]"] = None
+        self._total_size = 0
+
+    @classmethod
+    def from_settings(cls, settings: CacheSettings) -> "ResponseCache":
+        directory = Path(settings.directory)
+        if not directory.is_absolute():
+            directory = PROJECT_ROOT / directory
+        return cls(
+            directory=directory,
+            max_entries=settings.max_entries,
+            max_size_bytes=int(settings.max_size_mb * 1024 * 1024),
+            ttl_seconds=settings.ttl_seconds,
+        )
+
+    @staticmethod
+    def make_key(request: Dict[str, Any]) -> str:
+        """Hash a request into a stable cache key."""
+        canonical = json.dumps(
+            request,
+            sort_keys=True,
+            ensure_ascii=False,
+            separators=(",", ":"),
+            default=str,
+        )
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _path_for(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def _load_index(self) -> "OrderedDict[Path, int]":
+        """The in-memory index, scanning the directory on first use (call with the lock held)."""
+        if self._index is None:
+            entries = []
+            if self.directory.exists():
+                for path in self.directory.glob("*/*.json"):
+                    try:
+                        stat = path.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, path, stat.st_size))
+            entries.sort(key=lambda entry: entry[0])
+            self._index = OrderedDict((path, size) for _, path, size in entries)
+            self._total_size = sum(self._index.values())
+        return self._index
+
+    def _forget(self, path: Path) -> None:
+        """Drop path from the index (call with the lock held)."""
+        size = self._load_index().pop(path, None)
+        if size is not None:
+            self._total_size -= size
+
+    @staticmethod
+    def _unlink(path: Path) -> None:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached response for key, or None on a miss."""
+        path = self._path_for(key)
+        with self._lock:
+            self._load_index()
+        # Entries are replaced atomically, so reading needs no lock
+        try:
+            with path.open("r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            with self._lock:
+                self._forget(path)
+                self.misses += 1
+            if path.exists():
+                self._unlink(path)
+            return None
+
+        now = time.time()
+        if self.ttl_seconds is not None and now - entry["created"] > self.ttl_seconds:
+            with self._lock:
+                self._forget(path)
+                self.evictions += 1
+                self.misses += 1
+            self._unlink(path)
+            return None
+
+        # Keep the access time on disk for the scan of the next process
+        try:
+            os.utime(path, (now, now))
+            size = path.stat().st_size
+        except FileNotFoundError:
+            size = None
+        with self._lock:
+            index = self._index
+            if path in index:
+                # Most recently used last, so eviction pops from the front
+                index.move_to_end(path)
+            elif size is not None:
+                # Written by another process since the scan
+                index[path] = size
+                self._total_size += size
+            self.hits += 1
+        return entry["response"]
+
+    def set(self, key: str, response: Any) -> None:
+        """Store a response under key and evict old entries if needed."""
+        path = self._path_for(key)
+        payload = json.dumps(
+            {"created": time.time(), "response": response}, ensure_ascii=False
+        ).encode("utf-8")
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write atomically so concurrent readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            index = self._load_index()
+            self._forget(path)
+            index[path] = len(payload)
+            self._total_size += len(payload)
+            evicted = self._evict()
+        for old in evicted:
+            self._unlink(old)
+
+    async def aget(self, key: str) -> Optional[Any]:
+        """get() in a worker thread, keeping disk reads off the event loop."""
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, response: Any) -> None:
+        """set() in a worker thread, keeping disk writes off the event loop."""
+        await asyncio.to_thread(self.set, key, response)
+
+    def _evict(self) -> List[Path]:
+        """Drop least recently used entries beyond the limits from the index (call
+        with the lock held); returns their paths for the caller to delete.
+        """
+        index = self._index
+        evicted = []
+        while index and (
+            len(index) > self.max_entries or self._total_size > self.max_size_bytes
+        ):
+            path, size = index.popitem(last=False)
+            self._total_size -= size
+            self.evictions += 1
+            evicted.append(path)
+        return evicted
+
+    def clear(self) -> None:
+        """Remove every cached response."""
+        with self._lock:
+            paths = list(self._load_index())
+            self._index.clear()
+            self._total_size = 0
+        for path in paths:
+            self._unlink(path)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Hit, miss and eviction counters for this process."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._index or {}),
+            "size_bytes": self._total_size,
+        }
+
+
+_response_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """
+    Get the process-wide response cache.
+
+    Returns:
+        The shared ResponseCache, or None if caching is disabled in config
+    """
+    global _response_cache
+    if _response_cache is None and config.cache.enabled:
+        _response_cache = ResponseCache.from_settings(config.cache)
+        logger.info(f"LLM response cache enabled at {_response_cache.directory}")
+    return _response_cache
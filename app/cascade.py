@@ -0,0 +1,154 @@
+"""Model cascade: answer tool calls with cheap profiles first, escalating on failure."""
+import json
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+
+from openai.types.chat import ChatCompletionMessage
+
+from app.logger import logger
+from app.metrics import metrics
+from app.schema import ToolChoice
+
+
+if TYPE_CHECKING:
+    from app.llm import LLM
+
+# Accepts (True) or rejects (False) a tier's response
+CascadeValidator = Callable[[ChatCompletionMessage], bool]
+
+
+def check_tool_response(
+    message: ChatCompletionMessage,
+    tools: Optional[List[dict]] = None,
+    tool_choice: str = ToolChoice.AUTO,
+    validator: Optional[CascadeValidator] = None,
+) -> Optional[str]:
+    """
+    Check whether a tool-calling response is usable.
+
+    Returns:
+        None if the response is acceptable, otherwise the reason to escalate:
+        "empty", "no_tool_call", "malformed_arguments", "unknown_tool" or "validator"
+    """
+    if not message.content and not message.tool_calls:
+        return "empty"
+    if tool_choice == ToolChoice.REQUIRED and not message.tool_calls:
+        return "no_tool_call"
+
+    known = {tool.get("function", {}).get("name") for tool in tools or []}
+    for call in message.tool_calls or []:
+        arguments = call.function.arguments
+        if arguments and arguments.strip():
+            try:
+                if not isinstance(json.loads(arguments), dict):
+                    return "malformed_arguments"
+            except json.JSONDecodeError:
+                return "malformed_arguments"
+        if tools and call.function.name not in known:
+            return "unknown_tool"
+
+    if validator is not None and not validator(message):
+        return "validator"
+    return None
+
+
+class LLMCascade:
+    """Tries profiles from cheapest to strongest until one gives a usable answer.
+
+    Each tier's response is checked with ``check_tool_response``; a rejected
+    response, or an error that survived the tier's own retries, escalates the
+    request to the next tier. The last tier's answer is always returned.
+    Per-tier outcomes are counted in ``stats`` and in the metrics registry.
+    """
+
+    def __init__(
+        self,
+        tiers: List["LLM"],
+        names: List[str],
+        validator: Optional[CascadeValidator] = None,
+    ):
+        if not tiers:
+            raise ValueError("Cascade needs at least one tier")
+        self.tiers = tiers
+        self.names = names
+        self.validator = validator
+        self.stats: Dict[str, Dict[str, int]] = {
+            name: {"attempts": 0, "accepted": 0, "escalated": 0} for name in names
+        }
+        # reason -> number of escalations
+        self.escalation_reasons: Dict[str, int] = {}
+
+    def _record(self, name: str, outcome: str, reason: str = "") -> None:
+        if outcome == "escalated":
+            self.stats[name]["escalated"] += 1
+            self.escalation_reasons[reason] = self.escalation_reasons.get(reason, 0) + 1
+        elif outcome == "accepted":
+            self.stats[name]["accepted"] += 1
+        metrics.inc(
+            "llm_cascade_responses_total",
+            help="Cascade tier outcomes",
+            tier=name,
+            outcome=outcome,
+            reason=reason,
+        )
+
+    async def ask_tool(
+        self, validator: Optional[CascadeValidator] = None, **request
+    ) -> ChatCompletionMessage:
+        """
+        Run an ask_tool request through the tiers.
+
+        Args:
+            validator: Overrides the cascade's validator for this request
+            **request: Arguments for LLM.ask_tool
+
+        Returns:
+            ChatCompletionMessage: The first acceptable response, or the last tier's
+        """
+        validator = validator or self.validator
+
+        def check(message: ChatCompletionMessage) -> Optional[str]:
+            return check_tool_response(
+                message,
+                request.get("tools"),
+                request.get("tool_choice", ToolChoice.AUTO),
+                validator,
+            )
+
+        last = len(self.tiers) - 1
+        for i, (tier, name) in enumerate(zip(self.tiers, self.names)):
+            self.stats[name]["attempts"] += 1
+            try:
+                # Rejected responses stay out of the response cache
+                message = await tier._ask_tool(
+                    accept=lambda message: check(message) is None, **request
+                )
+            except Exception as e:
+                if i == last:
+                    raise
+                self._record(name, "escalated", "error")
+                logger.warning(f"Cascade tier '{name}' failed ({e}); escalating")
+                continue
+
+            reason = check(message)
+            if reason is None:
+                self._record(name, "accepted")
+                return message
+            if i == last:
+                # Nothing stronger to try: hand back what the last tier produced
+                self._record(name, "rejected", reason)
+                logger.warning(
+                    f"Cascade tier '{name}' response rejected ({reason}); no tier left"
+                )
+                return message
+            self._record(name, "escalated", reason)
+            logger.info(
+                f"Cascade tier '{name}' response rejected ({reason}); escalating"
+            )
+
+    @property
+    def hit_rates(self) -> Dict[str, Optional[float]]:
+        """Fraction of the requests reaching each tier that it answered."""
+        return {
+            name: (tier["accepted"] / tier["attempts"] if tier["attempts"] else None)
+            for name, tier in self.stats.items()
+        }
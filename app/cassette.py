@@ -0,0 +1,251 @@
+"""Record/replay of LLM calls for deterministic, offline benchmark runs."""
+import json
+import threading
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional
+
+from app.cache import ResponseCache
+from app.config import PROJECT_ROOT, CassetteSettings, config
+from app.exceptions import CassetteMismatchError
+from app.logger import logger
+
+
+PREVIEW_CHARS = 80
+
+
+def _normalize(value: Any) -> Any:
+    """Round-trip through JSON so live requests compare equal to recorded ones."""
+    return json.loads(json.dumps(value, ensure_ascii=False, default=str))
+
+
+def _preview(value: Any) -> str:
+    text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+    return text if len(text) <= PREVIEW_CHARS else text[:PREVIEW_CHARS] + "..."
+
+
+def _diff_values(recorded: Any, live: Any) -> str:
+    """Describe how two values differ, pointing at the first changed character."""
+    if isinstance(recorded, str) and isinstance(live, str):
+        offset = next(
+            (i for i, (a, b) in enumerate(zip(recorded, live)) if a != b),
+            min(len(recorded), len(live)),
+        )
+        start = max(offset - 20, 0)
+        return (
+            f"first difference at char {offset}: "
+            f"recorded {_preview(recorded[start:])!r}, live {_preview(live[start:])!r}"
+        )
+    return f"recorded {_preview(recorded)}, live {_preview(live)}"
+
+
+def _tool_names(tools: Optional[List[dict]]) -> List[str]:
+    return [tool.get("function", {}).get("name", "?") for tool in tools or []]
+
+
+def describe_mismatch(recorded: Dict[str, Any], live: Dict[str, Any]) -> List[str]:
+    """List every difference between a recorded request and a live one."""
+    problems = []
+    for field in sorted(set(recorded) | set(live)):
+        if field in ("messages", "tools") or recorded.get(field) == live.get(field):
+            continue
+        problems.append(
+            f"{field}: {_diff_values(recorded.get(field), live.get(field))}"
+        )
+
+    if recorded.get("tools") != live.get("tools"):
+        before, after = _tool_names(recorded.get("tools")), _tool_names(
+            live.get("tools")
+        )
+        if before != after:
+            problems.append(f"tools: recorded {before}, live {after}")
+        else:
+            changed = [
+                name
+                for name, a, b in zip(before, recorded["tools"], live["tools"])
+                if a != b
+            ]
+            problems.append(f"tools: schema changed for {changed}")
+
+    recorded_messages = recorded.get("messages") or []
+    live_messages = live.get("messages") or []
+    if len(recorded_messages) != len(live_messages):
+        problems.append(
+            f"messages: recorded {len(recorded_messages)}, live {len(live_messages)}"
+        )
+    for index, (a, b) in enumerate(zip(recorded_messages, live_messages)):
+        if a == b:
+            continue
+        for key in sorted(set(a) | set(b)):
+            if a.get(key) != b.get(key):
+                problems.append(
+                    f"messages[{index}] ({b.get('role')}).{key}: "
+                    f"{_diff_values(a.get(key), b.get(key))}"
+                )
+        break  # later messages usually differ as a consequence
+    return problems
+
+
+class Cassette:
+    """A JSONL file of LLM interactions, recorded from or replayed to a run.
+
+    In record mode every successful call is appended as one line holding the
+    request and the response. In replay mode calls are answered from the file:
+    a request identical to a recorded one gets that recording; otherwise the
+    next unused recording of the same method is compared with the live request
+    and every difference is reported. Strict cassettes raise
+    CassetteMismatchError, lenient ones log the differences and replay anyway.
+    """
+
+    def __init__(self, path: Path, mode: str, strict: bool = True):
+        self.path = Path(path)
+        self.mode = mode
+        self.strict = strict
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {"recorded": 0, "replayed": 0, "mismatches": 0}
+
+        self._interactions: List[Dict[str, Any]] = []
+        self._used: List[bool] = []
+        # key -> indexes of recordings with that request, in recorded order
+        self._by_key: Dict[str, Deque[int]] = defaultdict(deque)
+        # method -> indexes of recordings, in recorded order
+        self._by_method: Dict[str, Deque[int]] = defaultdict(deque)
+
+        if mode == "replay":
+            self._load()
+        elif mode == "record":
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.path.write_text("", encoding="utf-8")
+
+    @classmethod
+    def from_settings(cls, settings: CassetteSettings) -> "Cassette":
+        path = Path(settings.path)
+        if not path.is_absolute():
+            path = PROJECT_ROOT / path
+        return cls(path, settings.mode, settings.strict)
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def _load(self) -> None:
+        with self.path.open(encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                interaction = json.loads(line)
+                index = len(self._interactions)
+                self._interactions.append(interaction)
+                self._used.append(False)
+                self._by_key[interaction["key"]].append(index)
+                self._by_method[interaction["method"]].append(index)
+        logger.info(f"Replaying {len(self._interactions)} LLM calls from {self.path}")
+
+    def record(self, method: str, request: Dict[str, Any], response: Any) -> None:
+        """Append one successful call to the cassette."""
+        request = _normalize(request)
+        with self._lock:
+            interaction = {
+                "index": self.stats["recorded"],
+                "method": method,
+                "key": ResponseCache.make_key({"method": method, **request}),
+                "request": request,
+                "response": _normalize(response),
+            }
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write(json.dumps(interaction, ensure_ascii=False) + "\n")
+            self.stats["recorded"] += 1
+
+    def _take(self, queue: Deque[int]) -> Optional[int]:
+        while queue and self._used[queue[0]]:
+            queue.popleft()
+        if not queue:
+            return None
+        index = queue.popleft()
+        self._used[index] = True
+        return index
+
+    def replay(self, method: str, request: Dict[str, Any]) -> Any:
+        """
+        Answer a call from the recording.
+
+        Args:
+            method: The LLM method being replayed, e.g. "ask" or "ask_tool"
+            request: The live request
+
+        Returns:
+            The recorded response
+
+        Raises:
+            CassetteMismatchError: If no recording is left for this method, or
+                the strict cassette's next recording was made for a different request
+        """
+        request = _normalize(request)
+        key = ResponseCache.make_key({"method": method, **request})
+        with self._lock:
+            index = self._take(self._by_key[key])
+            if index is None:
+                index = self._take(self._by_method[method])
+                if index is None:
+                    self.stats["mismatches"] += 1
+                    raise CassetteMismatchError(
+                        f"Cassette {self.path.name} has no unused '{method}' recording left "
+                        f"(live request has {len(request.get('messages') or [])} messages)"
+                    )
+                interaction = self._interactions[index]
+                self.stats["mismatches"] += 1
+                problems = describe_mismatch(interaction["request"], request) or [
+                    "method-specific parameters differ"
+                ]
+                report = (
+                    f"Live '{method}' request differs from recording #{interaction['index']} "
+                    f"in {self.path.name}:\n  - " + "\n  - ".join(problems)
+                )
+                if self.strict:
+                    raise CassetteMismatchError(report)
+                logger.warning(report)
+            self.stats["replayed"] += 1
+            return self._interactions[index]["response"]
+
+    @property
+    def unused(self) -> int:
+        """Recordings that have not been replayed yet."""
+        return self._used.count(False)
+
+    def log_summary(self) -> None:
+        """Log what the cassette did during this run."""
+        if self.recording:
+            logger.info(f"Recorded {self.stats['recorded']} LLM calls to {self.path}")
+            return
+        summary = (
+            f"Replayed {self.stats['replayed']} LLM calls from {self.path.name}: "
+            f"{self.stats['mismatches']} mismatched, {self.unused} recordings unused"
+        )
+        if self.stats["mismatches"] or self.unused:
+            logger.warning(summary)
+        else:
+            logger.info(summary)
+
+
+_cassette: Optional[Cassette] = None
+_cassette_loaded = False
+
+
+def get_cassette() -> Optional[Cassette]:
+    """
+    Get the process-wide cassette.
+
+    Returns:
+        The shared Cassette, or None if record/replay is off in config
+    """
+    global _cassette, _cassette_loaded
+    if not _cassette_loaded:
+        _cassette_loaded = True
+        if config.cassette.mode != "off":
+            _cassette = Cassette.from_settings(config.cassette)
+            logger.info(f"LLM cassette in {_cassette.mode} mode at {_cassette.path}")
+    return _cassette
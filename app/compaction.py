@@ -0,0 +1,208 @@
+"""Rolling summary compaction of agent memory."""
+import asyncio
+from itertools import islice
+from typing import List, Optional
+
+from pydantic import BaseModel, Field, PrivateAttr
+
+from app.config import config
+from app.llm import LLM
+from app.logger import logger
+from app.schema import Memory, Message, Role
+from app.token_counter import estimate_tokens
+
+
+SUMMARY_PREFIX = "[Summary of the earlier conversation]"
+
+_SUMMARY_PROMPT = (
+    "You maintain the running summary of an AI agent's work on a task. Rewrite the "
+    "transcript below, which may begin with the previous summary, as a summary of at "
+    "most {words} words. Keep the user's requests, decisions made, facts and results "
+    "found, files written and anything still left to do. Reply with the summary only."
+)
+
+
+def _first_line(text: Optional[str], limit: int) -> str:
+    line = next(
+        (line.strip() for line in (text or "").splitlines() if line.strip()), ""
+    )
+    return line if len(line) <= limit else line[: limit - 3] + "..."
+
+
+def render_transcript(messages: List[Message], max_chars: int = 2000) -> str:
+    """Plain-text transcript of messages for a summarizing model, long ones shortened."""
+    lines = []
+    for message in messages:
+        content = message.content or ""
+        if len(content) > max_chars:
+            content = content[:max_chars] + " ...[shortened]"
+        if message.role == Role.TOOL:
+            lines.append(f"Result of {message.name}: {content}")
+        else:
+            lines.append(f"{message.role.capitalize()}: {content}".rstrip())
+        for call in message.tool_calls or []:
+            lines.append(
+                f"  called {call.function.name}({call.function.arguments[:300]})"
+            )
+    return "\n".join(lines)
+
+
+def extractive_summary(messages: List[Message], max_tokens: int) -> str:
+    """
+    Summarize messages locally, without a model.
+
+    Every user request is kept; each assistant turn, tool call and tool result
+    is reduced to its first line. When that is over max_tokens the oldest
+    lines are dropped first. A previous summary at the start is carried over
+    line by line, which makes the summary rolling.
+
+    Args:
+        messages: The messages to fold, oldest first
+        max_tokens: Target size of the summary
+
+    Returns:
+        str: The summary, one line per kept item
+    """
+    # (line, always keep)
+    lines = []
+    for message in messages:
+        content = message.content or ""
+        if message.role == Role.USER and content.startswith(SUMMARY_PREFIX):
+            for line in content[len(SUMMARY_PREFIX) :].strip().splitlines():
+                lines.append((line, line.startswith("User: ")))
+        elif message.role == Role.USER:
+            lines.append((f"User: {_first_line(content, 500)}", True))
+        elif message.role == Role.TOOL:
+            lines.append(
+                (f"- {message.name} returned: {_first_line(content, 200)}", False)
+            )
+        else:
+            if content.strip():
+                lines.append((f"- Assistant: {_first_line(content, 200)}", False))
+            for call in message.tool_calls or []:
+                lines.append(
+                    (
+                        f"- Called {call.function.name}({call.function.arguments[:120]})",
+                        False,
+                    )
+                )
+
+    budget = max_tokens - sum(estimate_tokens(line) for line, keep in lines if keep)
+    kept = set()
+    for position in range(len(lines) - 1, -1, -1):
+        line, keep = lines[position]
+        if not keep:
+            budget -= estimate_tokens(line)
+            if budget < 0:
+                break
+        kept.add(position)
+    return "\n".join(
+        line for position, (line, keep) in enumerate(lines) if keep or position in kept
+    )
+
+
+class MemoryCompactor(BaseModel):
+    """Folds older agent history into a rolling summary between steps.
+
+    After a step, if memory holds more than ``threshold_tokens``, everything but
+    the latest ``keep_recent_messages`` (and any tool call still waiting for
+    results) is summarized in a background task. Before a later step the
+    summary replaces the messages it covers, provided they are still in memory.
+    Steps never wait for a summary. The system prompt is not part of memory
+    and is unaffected.
+    """
+
+    threshold_tokens: Optional[int] = Field(
+        None, description="History size in tokens that triggers compaction"
+    )
+    keep_recent_messages: int = Field(8, description="Latest messages kept verbatim")
+    summary_profile: Optional[str] = Field(
+        None, description="LLM profile that writes summaries; None summarizes locally"
+    )
+    summary_max_tokens: int = Field(600, description="Target size of the summary")
+
+    _task: Optional[asyncio.Task] = PrivateAttr(default=None)
+    _last_folded: Optional[Message] = PrivateAttr(default=None)
+    _folded_count: int = PrivateAttr(default=0)
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    @classmethod
+    def from_config(cls) -> "MemoryCompactor":
+        """A compactor with the settings from the [memory] config section."""
+        settings = config.memory
+        return cls(
+            threshold_tokens=settings.compact_threshold_tokens,
+            keep_recent_messages=settings.keep_recent_messages,
+            summary_profile=settings.summary_profile,
+            summary_max_tokens=settings.summary_max_tokens,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold_tokens is not None
+
+    def schedule(self, memory: Memory) -> None:
+        """Start summarizing older history in the background if memory is too large."""
+        if not self.enabled or self._task is not None:
+            return
+        if memory.token_count <= self.threshold_tokens:
+            return
+        folded = memory.foldable_prefix(self.keep_recent_messages)
+        if folded < 2:
+            return
+        messages = list(islice(memory.messages, folded))
+        self._last_folded = messages[-1]
+        self._folded_count = folded
+        self._task = asyncio.create_task(self._summarize(messages))
+
+    def apply(self, memory: Memory) -> bool:
+        """Swap a finished summary into memory; never waits for one still running."""
+        task = self._task
+        if task is None or not task.done():
+            return False
+        self._task = None
+        if task.cancelled():
+            return False
+        if task.exception() is not None:
+            logger.warning(f"Memory compaction failed: {task.exception()}")
+            return False
+        before = memory.token_count
+        summary = Message.user_message(f"{SUMMARY_PREFIX}\n{task.result()}")
+        if not memory.compact(self._last_folded, summary):
+            logger.debug("Dropped a memory summary whose messages were already evicted")
+            return False
+        logger.info(
+            f"Compacted {self._folded_count} messages into a summary: "
+            f"history {before} -> {memory.token_count} tokens"
+        )
+        return True
+
+    def cancel(self) -> None:
+        """Abandon a summary still being written."""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self._task = None
+
+    async def _summarize(self, messages: List[Message]) -> str:
+        if self.summary_profile:
+            try:
+                summary = await LLM(config_name=self.summary_profile).ask(
+                    messages=[Message.user_message(render_transcript(messages))],
+                    system_msgs=[
+                        Message.system_message(
+                            _SUMMARY_PROMPT.format(
+                                words=self.summary_max_tokens * 3 // 4
+                            )
+                        )
+                    ],
+                    stream=False,
+                    temperature=0,
+                )
+                return summary.strip()
+            except Exception as e:
+                logger.warning(
+                    f"Summary by '{self.summary_profile}' failed, summarizing locally: {e}"
+                )
+        return extractive_summary(messages, self.summary_max_tokens)
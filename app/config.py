@@ -1,8 +1,7 @@
 import threading
 import tomllib
 from pathlib import Path
-
-from typing import Dict, List, Optional
+from typing import Dict, List, Literal, Optional, Union
 
 from pydantic import BaseModel, Field
 
@@ -24,12 +23,175 @@ class LLMSettings(BaseModel):
     temperature: float = Field(1.0, description="Sampling temperature")
     api_type: str = Field("", description="AzureOpenai or Openai")
     api_version: str = Field("", description="Azure Openai version if AzureOpenai")
+    context_window: Optional[int] = Field(
+        None, description="Model context size in tokens; requests are trimmed to fit"
+    )
+    max_retries: int = Field(
+        5, description="Retries for rate-limited or transient failures"
+    )
+    retry_max_wait: float = Field(
+        60, description="Longest backoff between retries in seconds"
+    )
+    retry_deadline: Optional[float] = Field(
+        None, description="Overall time limit per call in seconds, including retries"
+    )
+    max_concurrency: int = Field(16, description="Upper bound for in-flight requests")
+    rpm_limit: Optional[int] = Field(None, description="Requests-per-minute budget")
+    tpm_limit: Optional[int] = Field(None, description="Tokens-per-minute budget")
+    endpoints: List[str] = Field(
+        default_factory=list,
+        description="Profiles to route requests across; makes this a router profile",
+    )
+    cascade_profiles: List[str] = Field(
+        default_factory=list,
+        description="Cheaper profiles that try ask_tool requests before this one",
+    )
+    coalesce_requests: bool = Field(
+        True, description="Share one API call among identical in-flight requests"
+    )
+    hedge_percentile: Optional[float] = Field(
+        None, description="Hedge ask_tool calls slower than this latency percentile"
+    )
+    hedge_profile: Optional[str] = Field(
+        None, description="Profile that receives hedge requests (default: same profile)"
+    )
+    hedge_budget: float = Field(
+        0.1, description="Maximum hedge requests as a fraction of all requests"
+    )
+    input_cost_per_million: float = Field(
+        0.0, description="Price per million prompt tokens, for the usage ledger"
+    )
+    cached_input_cost_per_million: Optional[float] = Field(
+        None,
+        description="Price per million cached prompt tokens (default: input price)",
+    )
+    output_cost_per_million: float = Field(
+        0.0, description="Price per million completion tokens, for the usage ledger"
+    )
+    structured_output: Literal["json_schema", "json_object", "off"] = Field(
+        "json_schema",
+        description="How ask_json requests JSON: a response_format schema, plain JSON mode, or not at all",
+    )
+    warmup: bool = Field(
+        False,
+        description="Preload the model in the background when an agent is created",
+    )
+    keep_alive: Optional[Union[int, str]] = Field(
+        None,
+        description="How long Ollama keeps the model loaded, e.g. '30m' or -1 for ever",
+    )
+    keep_alive_interval: float = Field(
+        240,
+        description="Seconds between keep-alive preloads of a warmed Ollama model, 0 to disable",
+    )
 
 
 class ToolsConfig(BaseModel):
     tool_list: List[str] = Field(
-        default_factory=list,
-        description="List of enabled tools"
+        default_factory=list, description="List of enabled tools"
+    )
+
+
+class CacheSettings(BaseModel):
+    enabled: bool = Field(False, description="Whether to cache LLM responses on disk")
+    directory: str = Field(
+        "cache/llm", description="Cache directory, relative to the project root"
+    )
+    max_entries: int = Field(10000, description="Maximum number of cached responses")
+    max_size_mb: float = Field(512, description="Maximum total size of the cache in MB")
+    ttl_seconds: Optional[float] = Field(
+        7 * 24 * 3600, description="Maximum age of a cached response in seconds"
+    )
+    deterministic_only: bool = Field(
+        True, description="Only cache requests sent with temperature 0"
+    )
+
+
+class CassetteSettings(BaseModel):
+    mode: Literal["off", "record", "replay"] = Field(
+        "off", description="Record LLM calls to a cassette, or replay them from one"
+    )
+    path: str = Field(
+        "cassettes/run.jsonl", description="Cassette file, relative to the project root"
+    )
+    strict: bool = Field(
+        True, description="Fail replayed calls whose request differs from the recording"
+    )
+
+
+class BudgetSettings(BaseModel):
+    soft_tokens: Optional[int] = Field(
+        None, description="Tokens per agent run or flow after which a warning is logged"
+    )
+    hard_tokens: Optional[int] = Field(
+        None, description="Tokens per agent run or flow after which it is stopped"
+    )
+    soft_cost: Optional[float] = Field(
+        None,
+        description="Estimated cost per agent run or flow after which a warning is logged",
+    )
+    hard_cost: Optional[float] = Field(
+        None,
+        description="Estimated cost per agent run or flow after which it is stopped",
+    )
+
+
+class BlobSettings(BaseModel):
+    threshold_chars: Optional[int] = Field(
+        None,
+        description="Tool observations longer than this are stored as blobs (None: off)",
+    )
+    directory: str = Field(
+        "blobs", description="Blob store directory, relative to the project root"
+    )
+    preview_chars: int = Field(
+        2000,
+        description="Characters of a stored observation kept in memory as its preview",
+    )
+    max_read_chars: int = Field(
+        20000, description="Most characters read_blob returns per call"
+    )
+
+
+class MemorySettings(BaseModel):
+    compact_threshold_tokens: Optional[int] = Field(
+        None,
+        description="Agent history size in tokens that triggers compaction (None: never)",
+    )
+    keep_recent_messages: int = Field(
+        8, description="Latest messages that compaction always keeps verbatim"
+    )
+    summary_profile: Optional[str] = Field(
+        None,
+        description="LLM profile that writes summaries (None: local extractive summary)",
+    )
+    summary_max_tokens: int = Field(
+        600, description="Target size of the rolling summary"
+    )
+    store_directory: Optional[str] = Field(
+        None,
+        description="Directory for durable agent transcripts, relative to the project root (None: off)",
+    )
+    page_size: int = Field(
+        256, description="Transcript records read from disk at a time"
+    )
+
+
+class HttpPoolSettings(BaseModel):
+    max_connections: int = Field(
+        100, description="Maximum open connections per base URL"
+    )
+    max_keepalive_connections: int = Field(
+        20, description="Maximum idle keep-alive connections per base URL"
+    )
+    keepalive_expiry: float = Field(
+        30.0, description="Seconds an idle connection is kept open"
+    )
+    http2: bool = Field(False, description="Use HTTP/2 (requires the 'h2' package)")
+    connect_timeout: float = Field(10.0, description="Connect timeout in seconds")
+    read_timeout: float = Field(600.0, description="Read timeout in seconds")
+    pool_timeout: float = Field(
+        30.0, description="Seconds to wait for a free connection from the pool"
     )
 
 
@@ -66,6 +228,16 @@ class AppConfig(BaseModel):
 
     tools: ToolsConfig = Field(default_factory=ToolsConfig)
 
+    cache: CacheSettings = Field(default_factory=CacheSettings)
+
+    http: HttpPoolSettings = Field(default_factory=HttpPoolSettings)
+
+    cassette: CassetteSettings = Field(default_factory=CassetteSettings)
+
+    budget: BudgetSettings = Field(default_factory=BudgetSettings)
+    memory: MemorySettings = Field(default_factory=MemorySettings)
+    blobs: BlobSettings = Field(default_factory=BlobSettings)
+
     browser_config: Optional[BrowserSettings] = Field(
         None, description="Browser configuration"
     )
@@ -125,13 +297,50 @@ class Config:
             "temperature": base_llm.get("temperature", 1.0),
             "api_type": base_llm.get("api_type", ""),
             "api_version": base_llm.get("api_version", ""),
+            "context_window": base_llm.get("context_window"),
+            "max_retries": base_llm.get("max_retries", 5),
+            "retry_max_wait": base_llm.get("retry_max_wait", 60),
+            "retry_deadline": base_llm.get("retry_deadline"),
+            "max_concurrency": base_llm.get("max_concurrency", 16),
+            "rpm_limit": base_llm.get("rpm_limit"),
+            "tpm_limit": base_llm.get("tpm_limit"),
+            "coalesce_requests": base_llm.get("coalesce_requests", True),
+            "hedge_percentile": base_llm.get("hedge_percentile"),
+            "hedge_profile": base_llm.get("hedge_profile"),
+            "hedge_budget": base_llm.get("hedge_budget", 0.1),
+            "input_cost_per_million": base_llm.get("input_cost_per_million", 0.0),
+            "cached_input_cost_per_million": base_llm.get(
+                "cached_input_cost_per_million"
+            ),
+            "output_cost_per_million": base_llm.get("output_cost_per_million", 0.0),
+            "structured_output": base_llm.get("structured_output", "json_schema"),
+            "warmup": base_llm.get("warmup", False),
+            "keep_alive": base_llm.get("keep_alive"),
+            "keep_alive_interval": base_llm.get("keep_alive_interval", 240),
         }
 
-
         # 读取工具配置
         tools_config = raw_config.get("tools", {})
         tool_list = tools_config.get("tool_list", [])
 
+        # handle response cache config.
+        cache_settings = CacheSettings(**raw_config.get("cache", {}))
+
+        # handle shared HTTP connection pool config.
+        http_settings = HttpPoolSettings(**raw_config.get("http", {}))
+
+        # handle record/replay cassette config.
+        cassette_settings = CassetteSettings(**raw_config.get("cassette", {}))
+
+        # handle token/cost budget config.
+        budget_settings = BudgetSettings(**raw_config.get("budget", {}))
+
+        # handle agent memory compaction config.
+        memory_settings = MemorySettings(**raw_config.get("memory", {}))
+
+        # handle tool observation blob store config.
+        blob_settings = BlobSettings(**raw_config.get("blobs", {}))
+
         # handle browser config.
         browser_config = raw_config.get("browser", {})
         browser_settings = None
@@ -165,7 +374,6 @@ class Config:
             if valid_browser_params:
                 browser_settings = BrowserSettings(**valid_browser_params)
 
-
         config_dict = {
             "llm": {
                 "default": default_settings,
@@ -174,12 +382,14 @@ class Config:
                     for name, override_config in llm_overrides.items()
                 },
             },
-            "tools": {
-                "tool_list": tool_list
-            },
-
+            "tools": {"tool_list": tool_list},
+            "cache": cache_settings,
+            "http": http_settings,
+            "cassette": cassette_settings,
+            "budget": budget_settings,
+            "memory": memory_settings,
+            "blobs": blob_settings,
             "browser_config": browser_settings,
-
         }
 
         self._config = AppConfig(**config_dict)
@@ -187,11 +397,35 @@ class Config:
     @property
     def llm(self) -> Dict[str, LLMSettings]:
         return self._config.llm
-        
+
     @property
     def tools(self) -> ToolsConfig:
         return self._config.tools
 
+    @property
+    def cache(self) -> CacheSettings:
+        return self._config.cache
+
+    @property
+    def http(self) -> HttpPoolSettings:
+        return self._config.http
+
+    @property
+    def cassette(self) -> CassetteSettings:
+        return self._config.cassette
+
+    @property
+    def budget(self) -> BudgetSettings:
+        return self._config.budget
+
+    @property
+    def memory(self) -> MemorySettings:
+        return self._config.memory
+
+    @property
+    def blobs(self) -> BlobSettings:
+        return self._config.blobs
+
     @property
     def browser_config(self) -> Optional[BrowserSettings]:
         return self._config.browser_config
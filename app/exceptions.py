@@ -3,3 +3,20 @@ class ToolError(Exception):
 
     def __init__(self, message):
         self.message = message
+
+
+class CassetteMismatchError(Exception):
+    """Raised when a replayed LLM request has no matching recording."""
+
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
+
+class StructuredOutputError(ValueError):
+    """Raised when a structured LLM response is not JSON matching its schema."""
+
+    def __init__(self, message, errors=None):
+        super().__init__(message)
+        self.message = message
+        self.errors = errors or []
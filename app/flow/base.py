@@ -2,9 +2,10 @@ from abc import ABC, abstractmethod
 from enum import Enum
 from typing import Dict, List, Optional, Union
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from app.agent.base import BaseAgent
+from app.ledger import UsageLedger
 
 
 class FlowType(str, Enum):
@@ -17,6 +18,8 @@ class BaseFlow(BaseModel, ABC):
     agents: Dict[str, BaseAgent]
     tools: Optional[List] = None
     primary_agent_key: Optional[str] = None
+    # Usage of the whole flow, including its agents' runs
+    ledger: UsageLedger = Field(default_factory=lambda: UsageLedger.from_config("flow"))
 
     class Config:
         arbitrary_types_allowed = True
@@ -2,14 +2,17 @@ import json
 import time
 from typing import Dict, List, Optional, Union
 
+from openai import OpenAIError
 from pydantic import Field
 
 from app.agent.base import BaseAgent
 from app.flow.base import BaseFlow, PlanStepStatus
+from app.ledger import ledger_scope
 from app.llm import LLM
 from app.logger import logger
 from app.schema import AgentState, Message, ToolChoice
 from app.tool import PlanningTool
+from app.tool.planning import PLAN_SCHEMA
 
 
 class PlanningFlow(BaseFlow):
@@ -63,6 +66,13 @@ class PlanningFlow(BaseFlow):
 
     async def execute(self, input_text: str) -> str:
         """Execute the planning flow with agents."""
+        self.ledger.reset()
+        with ledger_scope(self.ledger):
+            result = await self._execute(input_text)
+        logger.info(self.ledger.format_report())
+        return result
+
+    async def _execute(self, input_text: str) -> str:
         try:
             if not self.primary_agent:
                 raise ValueError("No primary agent available")
@@ -91,6 +101,7 @@ class PlanningFlow(BaseFlow):
                 # Execute current step with appropriate agent
                 step_type = step_info.get("type") if step_info else None
                 executor = self.get_executor(step_type)
+                self.ledger.step = self.current_step_index
                 step_result = await self._execute_step(executor, step_info)
                 result += step_result + "\n"
 
@@ -98,6 +109,12 @@ class PlanningFlow(BaseFlow):
                 if hasattr(executor, "state") and executor.state == AgentState.FINISHED:
                     break
 
+                exhausted = self.ledger.exhausted
+                if exhausted:
+                    logger.warning(f"Budget exhausted: {exhausted}")
+                    result += f"Terminated: Budget exhausted ({exhausted})\n"
+                    break
+
             return result
         except Exception as e:
             logger.error(f"Error in PlanningFlow: {str(e)}")
@@ -119,6 +136,29 @@ class PlanningFlow(BaseFlow):
             f"Create a reasonable plan with clear steps to accomplish the task: {request}"
         )
 
+        # Ask for just the plan as JSON, a smaller request than the planning tool call
+        if self.llm.supports_structured_output:
+            try:
+                plan = await self.llm.ask_json(
+                    messages=[user_message],
+                    system_msgs=[system_message],
+                    schema=PLAN_SCHEMA,
+                    name="plan",
+                )
+            except (ValueError, OpenAIError) as e:
+                logger.warning(
+                    f"Structured plan creation failed, using the planning tool: {e}"
+                )
+            else:
+                result = await self.planning_tool.execute(
+                    command="create",
+                    plan_id=self.active_plan_id,
+                    title=plan["title"],
+                    steps=plan["steps"],
+                )
+                logger.info(f"Plan creation result: {str(result)}")
+                return
+
         # Call LLM with PlanningTool
         response = await self.llm.ask_tool(
             messages=[user_message],
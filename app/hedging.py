@@ -0,0 +1,58 @@
+"""Latency tracking and budgeting for hedged LLM requests."""
+from collections import deque
+from typing import Deque, Dict, Optional
+
+
+class Hedger:
+    """Decides when a slow request deserves a duplicate (hedge) request.
+
+    A hedge is sent once the first request has been outstanding longer than
+    the ``percentile`` of recent latencies. Each observed request earns
+    ``budget_ratio`` hedge credits (capped at ``max_burst``) and each hedge
+    spends one, so hedges stay a bounded fraction of total traffic.
+    """
+
+    def __init__(
+        self,
+        percentile: float = 95.0,
+        budget_ratio: float = 0.1,
+        min_samples: int = 20,
+        window: int = 200,
+        max_burst: float = 5.0,
+    ):
+        self.percentile = percentile
+        self.budget_ratio = budget_ratio
+        self.min_samples = min_samples
+        self.max_burst = max_burst
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self._credits = 0.0
+
+        self.stats: Dict[str, int] = {
+            "requests": 0,
+            "hedged": 0,
+            "hedge_wins": 0,
+            "budget_denied": 0,
+        }
+
+    def observe(self, latency: float) -> None:
+        """Record the latency of a finished request and earn hedge credit."""
+        self._latencies.append(latency)
+        self.stats["requests"] += 1
+        self._credits = min(self._credits + self.budget_ratio, self.max_burst)
+
+    def delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None while there is too little data."""
+        if len(self._latencies) < self.min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        index = min(int(len(ordered) * self.percentile / 100), len(ordered) - 1)
+        return ordered[index]
+
+    def try_spend(self) -> bool:
+        """Spend one hedge credit if the budget allows it."""
+        if self._credits < 1:
+            self.stats["budget_denied"] += 1
+            return False
+        self._credits -= 1
+        self.stats["hedged"] += 1
+        return True
@@ -0,0 +1,105 @@
+"""Shared HTTP connection pools for LLM clients."""
+import asyncio
+import threading
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+from app.config import HttpPoolSettings, config
+from app.logger import logger
+
+
+# (base_url, event loop) -> client; an httpx client must stay on the loop it first ran on
+_pools: Dict[Tuple[str, Optional[asyncio.AbstractEventLoop]], httpx.AsyncClient] = {}
+_pools_lock = threading.Lock()
+
+
+def running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    """The event loop running in this thread, or None outside of one."""
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _create_pool(settings: HttpPoolSettings) -> httpx.AsyncClient:
+    http2 = settings.http2
+    if http2 and not _http2_available():
+        logger.warning(
+            "HTTP/2 requested but the 'h2' package is not installed; using HTTP/1.1"
+        )
+        http2 = False
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=settings.max_connections,
+            max_keepalive_connections=settings.max_keepalive_connections,
+            keepalive_expiry=settings.keepalive_expiry,
+        ),
+        timeout=httpx.Timeout(
+            settings.read_timeout,
+            connect=settings.connect_timeout,
+            pool=settings.pool_timeout,
+        ),
+        follow_redirects=True,
+    )
+
+
+def _forget_closed_loops() -> None:
+    # Pools of finished loops can no longer be closed cleanly; just drop them
+    for key in [key for key in _pools if key[1] is not None and key[1].is_closed()]:
+        del _pools[key]
+
+
+def get_http_client(base_url: str) -> httpx.AsyncClient:
+    """
+    Get the pooled HTTP client shared by every LLM profile using base_url.
+
+    Each event loop gets its own pool; clients created outside a running
+    loop share one pool that belongs to whichever loop uses it first.
+
+    Args:
+        base_url: The API base URL
+
+    Returns:
+        The httpx.AsyncClient for that base URL on the running event loop
+    """
+    key = (base_url.rstrip("/"), running_loop())
+    with _pools_lock:
+        _forget_closed_loops()
+        client = _pools.get(key)
+        if client is None or client.is_closed:
+            client = _create_pool(config.http)
+            _pools[key] = client
+        return client
+
+
+async def close_http_pool(base_url: str) -> None:
+    """Close the pool for base_url on the running event loop."""
+    key = (base_url.rstrip("/"), running_loop())
+    with _pools_lock:
+        client = _pools.pop(key, None)
+    if client is not None and not client.is_closed:
+        await client.aclose()
+
+
+async def close_http_pools() -> None:
+    """Close the pools of the running event loop, and those created outside any loop.
+
+    Call once at shutdown, from the loop that used them.
+    """
+    loop = running_loop()
+    with _pools_lock:
+        keys = [key for key in _pools if key[1] is loop or key[1] is None]
+        clients = [_pools.pop(key) for key in keys]
+    for client in clients:
+        if not client.is_closed:
+            await client.aclose()
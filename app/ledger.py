@@ -0,0 +1,233 @@
+"""Token and cost accounting with budgets for agent runs and flows."""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Any, Dict, Iterator, Optional
+
+from pydantic import BaseModel, Field, PrivateAttr
+
+from app.config import config
+from app.logger import logger
+
+
+if TYPE_CHECKING:
+    from app.metrics import LLMCall
+
+# Bucket for LLM calls made outside any tool, i.e. by the agent's own reasoning
+AGENT_SCOPE = "(agent)"
+
+
+def call_cost(call: "LLMCall") -> float:
+    """Estimated cost of one LLM call from the pricing of the profile that served it."""
+    profile = call.endpoint or call.profile
+    settings = config.llm.get(profile, config.llm["default"])
+    uncached = max(call.prompt_tokens - call.cached_tokens, 0)
+    cached_price = (
+        settings.cached_input_cost_per_million
+        if settings.cached_input_cost_per_million is not None
+        else settings.input_cost_per_million
+    )
+    return (
+        uncached * settings.input_cost_per_million
+        + call.cached_tokens * cached_price
+        + call.completion_tokens * settings.output_cost_per_million
+    ) / 1_000_000
+
+
+class UsageTotals(BaseModel):
+    """Accumulated LLM usage of one ledger bucket."""
+
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    cost: float = 0.0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def add(self, call: "LLMCall", cost: float) -> None:
+        self.calls += 1
+        self.prompt_tokens += call.prompt_tokens
+        self.completion_tokens += call.completion_tokens
+        self.cached_tokens += call.cached_tokens
+        self.cost += cost
+
+
+class ToolRuns(BaseModel):
+    """How often a tool ran and for how long."""
+
+    runs: int = 0
+    seconds: float = 0.0
+
+
+class UsageLedger(BaseModel):
+    """Accumulates the tokens and estimated cost of an agent run or flow.
+
+    Usage is broken down by step, by tool (calls made outside tools count
+    towards ``AGENT_SCOPE``) and by profile, and rolls up into the ledger of
+    the enclosing run, so a flow's ledger also sees its agents' usage. Crossing
+    a soft budget logs a warning once; crossing a hard budget marks the ledger
+    exhausted, which stops the run after the current step.
+    """
+
+    name: str = "run"
+    soft_tokens: Optional[int] = None
+    hard_tokens: Optional[int] = None
+    soft_cost: Optional[float] = None
+    hard_cost: Optional[float] = None
+
+    step: Optional[int] = Field(
+        None, description="Step that new usage is attributed to"
+    )
+    totals: UsageTotals = Field(default_factory=UsageTotals)
+    by_step: Dict[str, UsageTotals] = Field(default_factory=dict)
+    by_tool: Dict[str, UsageTotals] = Field(default_factory=dict)
+    by_profile: Dict[str, UsageTotals] = Field(default_factory=dict)
+    tool_runs: Dict[str, ToolRuns] = Field(default_factory=dict)
+
+    _parent: Optional["UsageLedger"] = PrivateAttr(default=None)
+    _soft_warned: bool = PrivateAttr(default=False)
+
+    @classmethod
+    def from_config(cls, name: str = "run") -> "UsageLedger":
+        """A ledger with the budgets from the [budget] config section."""
+        return cls(name=name, **config.budget.model_dump())
+
+    def reset(self) -> None:
+        """Forget recorded usage, keeping the budgets."""
+        self.step = None
+        self.totals = UsageTotals()
+        self.by_step = {}
+        self.by_tool = {}
+        self.by_profile = {}
+        self.tool_runs = {}
+        self._soft_warned = False
+
+    def record(self, call: "LLMCall", cost: Optional[float] = None) -> None:
+        """Add a finished LLM call here and in every enclosing ledger."""
+        if cost is None:
+            cost = call_cost(call)
+        step = str(self.step) if self.step is not None else "-"
+        tool = _current_tool.get() or AGENT_SCOPE
+        profile = call.endpoint or call.profile
+        self.totals.add(call, cost)
+        for buckets, key in (
+            (self.by_step, step),
+            (self.by_tool, tool),
+            (self.by_profile, profile),
+        ):
+            buckets.setdefault(key, UsageTotals()).add(call, cost)
+        self._check_soft_budget()
+        if self._parent is not None:
+            self._parent.record(call, cost)
+
+    def record_tool(self, name: str, seconds: float) -> None:
+        """Count one tool execution here and in every enclosing ledger."""
+        runs = self.tool_runs.setdefault(name, ToolRuns())
+        runs.runs += 1
+        runs.seconds += seconds
+        if self._parent is not None:
+            self._parent.record_tool(name, seconds)
+
+    def _check_soft_budget(self) -> None:
+        if self._soft_warned:
+            return
+        over_tokens = (
+            self.soft_tokens is not None
+            and self.totals.total_tokens >= self.soft_tokens
+        )
+        over_cost = self.soft_cost is not None and self.totals.cost >= self.soft_cost
+        if over_tokens or over_cost:
+            self._soft_warned = True
+            logger.warning(
+                f"'{self.name}' passed its soft budget: {self.totals.total_tokens} tokens, "
+                f"${self.totals.cost:.4f} (soft limits: {self.soft_tokens} tokens, ${self.soft_cost})"
+            )
+
+    @property
+    def exhausted(self) -> Optional[str]:
+        """Why this ledger or an enclosing one ran out of budget, or None."""
+        if (
+            self.hard_tokens is not None
+            and self.totals.total_tokens >= self.hard_tokens
+        ):
+            return (
+                f"'{self.name}' used {self.totals.total_tokens} tokens "
+                f"(hard budget {self.hard_tokens})"
+            )
+        if self.hard_cost is not None and self.totals.cost >= self.hard_cost:
+            return f"'{self.name}' spent ${self.totals.cost:.4f} (hard budget ${self.hard_cost})"
+        return self._parent.exhausted if self._parent is not None else None
+
+    def report(self) -> Dict[str, Any]:
+        """The ledger as a JSON-serializable dict."""
+        return self.model_dump(exclude={"step"})
+
+    def format_report(self) -> str:
+        """A plain-text usage table by step, tool and profile."""
+
+        def row(label: str, totals: UsageTotals, extra: str = "") -> str:
+            return (
+                f"  {label:<24} {totals.calls:>5} {totals.prompt_tokens:>10} "
+                f"{totals.completion_tokens:>10} {totals.cached_tokens:>8} "
+                f"{totals.cost:>10.4f}{extra}"
+            )
+
+        header = f"  {'':<24} {'calls':>5} {'prompt':>10} {'completion':>10} {'cached':>8} {'cost $':>10}"
+        lines = [f"Usage for '{self.name}':", header, row("total", self.totals)]
+        if self.by_step:
+            lines.append(" by step:")
+            lines.extend(row(key, totals) for key, totals in self.by_step.items())
+        tools = list(self.by_tool) + [
+            t for t in self.tool_runs if t not in self.by_tool
+        ]
+        if tools:
+            lines.append(" by tool:")
+            for name in tools:
+                runs = self.tool_runs.get(name)
+                extra = f"  ({runs.runs} runs, {runs.seconds:.1f}s)" if runs else ""
+                lines.append(row(name, self.by_tool.get(name, UsageTotals()), extra))
+        if self.by_profile:
+            lines.append(" by profile:")
+            lines.extend(row(key, totals) for key, totals in self.by_profile.items())
+        return "\n".join(lines)
+
+
+_current_ledger: ContextVar[Optional[UsageLedger]] = ContextVar(
+    "current_ledger", default=None
+)
+_current_tool: ContextVar[Optional[str]] = ContextVar("current_tool", default=None)
+
+
+def current_ledger() -> Optional[UsageLedger]:
+    """The ledger collecting usage in the current task, if any."""
+    return _current_ledger.get()
+
+
+@contextmanager
+def ledger_scope(ledger: UsageLedger) -> Iterator[UsageLedger]:
+    """Collect LLM usage into ledger, rolling it up into the enclosing ledger."""
+    parent = _current_ledger.get()
+    ledger._parent = parent if parent is not ledger else None
+    token = _current_ledger.set(ledger)
+    try:
+        yield ledger
+    finally:
+        _current_ledger.reset(token)
+        ledger._parent = None
+
+
+@contextmanager
+def tool_scope(name: str) -> Iterator[None]:
+    """Attribute LLM usage and run time inside the block to tool name."""
+    token = _current_tool.set(name)
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        _current_tool.reset(token)
+        ledger = _current_ledger.get()
+        if ledger is not None:
+            ledger.record_tool(name, time.monotonic() - start)
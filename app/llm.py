@@ -1,38 +1,85 @@
-from typing import Dict, List, Optional, Union
+import asyncio
+import inspect
+import json
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple, Union
 
+import httpx
 from openai import (
     APIError,
     AsyncAzureOpenAI,
     AsyncOpenAI,
     AuthenticationError,
+    BadRequestError,
     OpenAIError,
     RateLimitError,
 )
-from tenacity import retry, stop_after_attempt, wait_random_exponential
+from openai.types.chat import ChatCompletionMessage, ChatCompletionMessageToolCall
+from openai.types.chat.chat_completion_message_tool_call import Function
 
+from app.batch import BatchResult, run_bounded
+from app.cache import ResponseCache, get_response_cache
+from app.cascade import CascadeValidator, LLMCascade
+from app.cassette import Cassette, get_cassette
 from app.config import LLMSettings, config
+from app.exceptions import StructuredOutputError
+from app.hedging import Hedger
+from app.http_pool import close_http_pool, get_http_client, running_loop
 from app.logger import logger  # Assuming a logger is set up in your app
-from app.schema import Message, TOOL_CHOICE_TYPE, ROLE_VALUES, TOOL_CHOICE_VALUES, ToolChoice
+from app.metrics import current_call, track_llm_call
+from app.rate_limiter import AdaptiveLimiter, get_rate_limiter
+from app.retry import RetryPolicy, disable_retry, is_retryable, with_retry_policy
+from app.router import LLMRouter
+from app.schema import (
+    ROLE_VALUES,
+    TOOL_CHOICE_TYPE,
+    TOOL_CHOICE_VALUES,
+    Message,
+    ToolChoice,
+)
+from app.singleflight import SingleFlight
+from app.streaming import StdoutSink, StreamSink
+from app.structured import (
+    parse_structured,
+    rejects_response_format,
+    response_format,
+    schema_instruction,
+)
+from app.token_counter import TokenCounter, TokenReport
+from app.warmup import close_warmer, get_warmer
 
 
 class LLM:
-    _instances: Dict[str, "LLM"] = {}
+    # event loop (None outside of one) -> profile name -> instance. In-flight
+    # calls belong to one loop, so each loop gets its own instances; the SDK
+    # client is resolved per loop on each call (see ``client``).
+    _instances: Dict[Optional[asyncio.AbstractEventLoop], Dict[str, "LLM"]] = {}
+    # Re-entrant: router, cascade and hedge profiles are created during __init__
+    _instances_lock = threading.RLock()
 
     def __new__(
         cls, config_name: str = "default", llm_config: Optional[LLMSettings] = None
     ):
-        if config_name not in cls._instances:
-            instance = super().__new__(cls)
-            instance.__init__(config_name, llm_config)
-            cls._instances[config_name] = instance
-        return cls._instances[config_name]
+        loop = running_loop()
+        with cls._instances_lock:
+            for stale in [l for l in cls._instances if l is not None and l.is_closed()]:
+                del cls._instances[stale]
+            registry = cls._instances.setdefault(loop, {})
+            if config_name not in registry:
+                instance = super().__new__(cls)
+                instance.__init__(config_name, llm_config)
+                registry[config_name] = instance
+            return registry[config_name]
 
     def __init__(
         self, config_name: str = "default", llm_config: Optional[LLMSettings] = None
     ):
-        if not hasattr(self, "client"):  # Only initialize if not already initialized
+        if not hasattr(self, "_clients"):  # Only initialize if not already initialized
             llm_config = llm_config or config.llm
             llm_config = llm_config.get(config_name, llm_config["default"])
+            self.config_name = config_name
             self.model = llm_config.model
             self.max_tokens = llm_config.max_tokens
             self.temperature = llm_config.temperature
@@ -40,14 +87,197 @@ class LLM:
             self.api_key = llm_config.api_key
             self.api_version = llm_config.api_version
             self.base_url = llm_config.base_url
-            if self.api_type == "azure":
-                self.client = AsyncAzureOpenAI(
-                    base_url=self.base_url,
-                    api_key=self.api_key,
-                    api_version=self.api_version,
+            self.structured_output = llm_config.structured_output
+            # event loop -> (its connection pool, SDK client on that pool)
+            self._clients: Dict[
+                Optional[asyncio.AbstractEventLoop],
+                Tuple[httpx.AsyncClient, Union[AsyncOpenAI, AsyncAzureOpenAI]],
+            ] = {}
+            self.context_window = llm_config.context_window
+            self.retry_policy = RetryPolicy(
+                max_attempts=llm_config.max_retries + 1,
+                max_wait=llm_config.retry_max_wait,
+                deadline=llm_config.retry_deadline,
+            )
+            self.token_counter = TokenCounter(self.model)
+            self.cache: Optional[ResponseCache] = get_response_cache()
+            self.cassette: Optional[Cassette] = get_cassette()
+            self.rate_limiter: AdaptiveLimiter = get_rate_limiter(
+                self.base_url,
+                self.model,
+                max_concurrency=llm_config.max_concurrency,
+                rpm=llm_config.rpm_limit,
+                tpm=llm_config.tpm_limit,
+            )
+            self.router: Optional[LLMRouter] = None
+            endpoint_names = [
+                name for name in llm_config.endpoints if name != config_name
+            ]
+            if endpoint_names:
+                self.router = LLMRouter(
+                    [LLM(config_name=name) for name in endpoint_names],
+                    endpoint_names,
+                )
+            self.cascade: Optional[LLMCascade] = None
+            cascade_names = [
+                name for name in llm_config.cascade_profiles if name != config_name
+            ]
+            if cascade_names:
+                self.cascade = LLMCascade(
+                    [LLM(config_name=name) for name in cascade_names] + [self],
+                    cascade_names + [config_name],
+                )
+            # Where ask(stream=True) sends text when no sink is passed; None means stdout
+            self.stream_sink: Optional[StreamSink] = None
+            self.coalesce_requests = llm_config.coalesce_requests
+            self.singleflight = SingleFlight()
+            self.warmup = llm_config.warmup
+            self.warmup_settings = dict(
+                keep_alive=llm_config.keep_alive,
+                keep_alive_interval=llm_config.keep_alive_interval,
+            )
+            self.hedger: Optional[Hedger] = None
+            self.hedge_profile = llm_config.hedge_profile
+            if llm_config.hedge_percentile:
+                self.hedger = Hedger(
+                    percentile=llm_config.hedge_percentile,
+                    budget_ratio=llm_config.hedge_budget,
                 )
-            else:
-                self.client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url)
+
+    @property
+    def client(self) -> Union[AsyncOpenAI, AsyncAzureOpenAI]:
+        """The SDK client for the running event loop.
+
+        Resolved on every call rather than in __init__, so an instance created
+        before ``asyncio.run`` (or used by several runs) always talks through
+        the connection pool of the loop it is running on.
+        """
+        loop = running_loop()
+        # Profiles with the same base_url share one keep-alive connection pool
+        http_client = get_http_client(self.base_url)
+        cached = self._clients.get(loop)
+        if cached is not None and cached[0] is http_client:
+            return cached[1]
+        for stale in [l for l in self._clients if l is not None and l.is_closed()]:
+            del self._clients[stale]
+        # The SDK's own retries are off: retry_policy is the only retry layer,
+        # so every attempt is counted and every 429 reaches the rate limiter.
+        if self.api_type == "azure":
+            client = AsyncAzureOpenAI(
+                base_url=self.base_url,
+                api_key=self.api_key,
+                api_version=self.api_version,
+                http_client=http_client,
+                max_retries=0,
+            )
+        else:
+            client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                http_client=http_client,
+                max_retries=0,
+            )
+        self._clients[loop] = (http_client, client)
+        return client
+
+    async def aclose(self) -> None:
+        """Unregister this instance and close its HTTP pool once no other
+        instance on the running event loop uses it.
+        """
+        loop = running_loop()
+        self._clients.pop(loop, None)
+        with self._instances_lock:
+            registry = self._instances.get(loop, {})
+            if registry.get(self.config_name) is self:
+                del registry[self.config_name]
+            if not registry:
+                self._instances.pop(loop, None)
+            pool_in_use = any(
+                llm.base_url == self.base_url for llm in registry.values()
+            )
+            model_in_use = any(
+                llm.base_url == self.base_url and llm.model == self.model
+                for llm in registry.values()
+            )
+        if not model_in_use:
+            await close_warmer(self.base_url, self.model)
+        if not pool_in_use:
+            await close_http_pool(self.base_url)
+
+    def start_warmup(self) -> None:
+        """Warm up this profile, and the profiles it routes or cascades to, in the background.
+
+        Only profiles with ``warmup`` enabled are warmed, once per model and
+        event loop; outside a running loop this does nothing.
+        """
+        profiles = [self]
+        if self.router:
+            profiles += self.router.endpoints
+        if self.cascade:
+            profiles += self.cascade.tiers
+        for llm in profiles:
+            if llm.warmup:
+                get_warmer(llm, **llm.warmup_settings).start()
+
+    @classmethod
+    async def aclose_all(cls) -> None:
+        """Close every instance created on the running event loop."""
+        with cls._instances_lock:
+            instances = list(cls._instances.get(running_loop(), {}).values())
+        for llm in instances:
+            await llm.aclose()
+
+    def _request_key(self, kind: str, temperature: float, **request) -> str:
+        """Hash everything that determines the response to a request."""
+        return ResponseCache.make_key(
+            {
+                "kind": kind,
+                "model": self.model,
+                "base_url": self.base_url,
+                "max_tokens": self.max_tokens,
+                "temperature": temperature,
+                **request,
+            }
+        )
+
+    def _cache_key(self, kind: str, temperature: float, **request) -> Optional[str]:
+        """Build the cache key for a request, or None if it must not be cached."""
+        if self.cache is None:
+            return None
+        if config.cache.deterministic_only and temperature != 0:
+            return None
+        return self._request_key(kind, temperature, **request)
+
+    def _cassette_request(self, temperature: float, **request) -> Dict[str, Any]:
+        """The request as recorded in, and matched against, a cassette."""
+        return {
+            "profile": self.config_name,
+            "model": self.model,
+            "max_tokens": self.max_tokens,
+            "temperature": temperature,
+            **request,
+        }
+
+    def _replay(self, method: str, request: Dict[str, Any]) -> Optional[Any]:
+        """The recorded response when replaying a cassette, otherwise None."""
+        if self.cassette is None or not self.cassette.replaying:
+            return None
+        response = self.cassette.replay(method, request)
+        self._mark_call_source("cassette")
+        return response
+
+    def _record(self, method: str, request: Dict[str, Any], response: Any) -> None:
+        if self.cassette is not None and self.cassette.recording:
+            self.cassette.record(method, request, response)
+
+    async def _coalesce(self, key: str, fetch: Callable[[], Any]) -> Any:
+        """Share one in-flight call among identical concurrent requests."""
+        if not self.coalesce_requests:
+            return await fetch()
+        if key in self.singleflight:
+            logger.debug(f"Coalescing identical in-flight LLM request ({key[:12]})")
+            self._mark_call_source("coalesced")
+        return await self.singleflight.do(key, fetch)
 
     @staticmethod
     def format_messages(messages: List[Union[dict, Message]]) -> List[dict]:
@@ -75,38 +305,195 @@ class LLM:
         formatted_messages = []
 
         for message in messages:
-            if isinstance(message, dict):
+            if isinstance(message, Message):
+                # Message objects are validated once and their dict is reused
+                formatted_messages.append(message.to_wire())
+            elif isinstance(message, dict):
                 # If message is already a dict, ensure it has required fields
                 if "role" not in message:
                     raise ValueError("Message dict must contain 'role' field")
+                if message["role"] not in ROLE_VALUES:
+                    raise ValueError(f"Invalid role: {message['role']}")
+                if "content" not in message and "tool_calls" not in message:
+                    raise ValueError(
+                        "Message must contain either 'content' or 'tool_calls'"
+                    )
                 formatted_messages.append(message)
-            elif isinstance(message, Message):
-                # If message is a Message object, convert it to dict
-                formatted_messages.append(message.to_dict())
             else:
                 raise TypeError(f"Unsupported message type: {type(message)}")
 
-        # Validate all messages have required fields
-        for msg in formatted_messages:
-            if msg["role"] not in ROLE_VALUES:
-                raise ValueError(f"Invalid role: {msg['role']}")
-            if "content" not in msg and "tool_calls" not in msg:
-                raise ValueError(
-                    "Message must contain either 'content' or 'tool_calls'"
-                )
-
         return formatted_messages
 
-    @retry(
-        wait=wait_random_exponential(min=1, max=60),
-        stop=stop_after_attempt(6),
-    )
+    @property
+    def prompt_token_limit(self) -> Optional[int]:
+        """Tokens available for the prompt once the completion is reserved."""
+        if not self.context_window:
+            return None
+        return max(self.context_window - self.max_tokens, 0)
+
+    def _prepare_messages(
+        self,
+        messages: List[Union[dict, Message]],
+        system_msgs: Optional[List[Union[dict, Message]]] = None,
+        tools: Optional[List[dict]] = None,
+    ) -> Tuple[List[dict], TokenReport]:
+        """Format messages and trim them to fit the model's context window.
+
+        Returns:
+            The messages to send and their TokenReport. The report belongs to
+            this request: instances are shared by concurrent calls, so it is
+            passed along rather than stored on the instance.
+        """
+        if system_msgs:
+            messages = list(system_msgs) + list(messages)
+        formatted = self.format_messages(messages)
+        # Message objects keep their count, so only new messages are tokenized
+        counter = self.token_counter
+        counts = [
+            message.token_count(counter)
+            if isinstance(message, Message)
+            else counter.count_message(message)
+            for message in messages
+        ]
+
+        formatted, report = counter.fit(
+            formatted, tools=tools, limit=self.prompt_token_limit, counts=counts
+        )
+        logger.debug(f"Prompt size for {self.model}: {report}")
+        return formatted, report
+
+    @staticmethod
+    def _mark_call_source(source: str) -> None:
+        call = current_call()
+        if call is not None:
+            call.source = source
+
+    def _record_streamed_usage(self, prompt_tokens: int, completion_text: str) -> int:
+        """Estimate usage for a stream, which reports no usage object."""
+        completion_tokens = self.token_counter.count_text(completion_text)
+        call = current_call()
+        if call is not None:
+            call.prompt_tokens += prompt_tokens
+            call.completion_tokens += completion_tokens
+        return completion_tokens
+
+    @asynccontextmanager
+    async def _connection(self, prompt_tokens: int):
+        """Pick the endpoint for one request and hold its rate-limit lease.
+
+        Args:
+            prompt_tokens: Tokens to reserve for the prompt
+
+        Yields:
+            (endpoint, lease): the LLM whose client and model serve the request,
+            and the lease used to report completion tokens
+        """
+        endpoint, probe = self.router.select() if self.router else (self, False)
+        call = current_call()
+        if call is not None:
+            call.endpoint = endpoint.config_name
+        recorded = False
+        try:
+            async with endpoint.rate_limiter.lease(prompt_tokens) as lease:
+                start = time.monotonic()
+                try:
+                    yield endpoint, lease
+                except Exception as e:
+                    if self.router:
+                        # Only transient errors count against the endpoint; a
+                        # 4xx or a bad response still shows it is up
+                        self.router.record(
+                            endpoint,
+                            not is_retryable(e),
+                            time.monotonic() - start,
+                            probe,
+                        )
+                        recorded = True
+                    raise
+                if self.router:
+                    self.router.record(endpoint, True, time.monotonic() - start, probe)
+                    recorded = True
+        finally:
+            # Cancelled (a losing hedge, a deadline, a cancelled coalesced leader)
+            # or failed while queueing: a probe must not stay outstanding
+            if probe and not recorded:
+                self.router.cancel_probe(endpoint)
+
+    async def _create_completion(self, prompt_tokens: int, **params):
+        """Send one non-streaming completion through the selected endpoint."""
+        async with self._connection(prompt_tokens) as (endpoint, lease):
+            response = await endpoint.client.chat.completions.create(
+                model=endpoint.model, **params
+            )
+            if response.usage:
+                lease.record_usage(response.usage.completion_tokens)
+                call = current_call()
+                if call is not None:
+                    call.record_usage(response.usage)
+        return response
+
+    async def _hedged_completion(self, prompt_tokens: int, **params):
+        """Send a completion, duplicating it if it runs slower than usual.
+
+        Once the first request has been outstanding longer than the configured
+        latency percentile, and the hedge budget allows, a second request goes
+        to the hedge profile (or this profile again). The first valid response
+        wins and the other request is cancelled.
+        """
+        if self.hedger is None:
+            return await self._create_completion(prompt_tokens, **params)
+
+        start = time.monotonic()
+        primary = asyncio.create_task(self._create_completion(prompt_tokens, **params))
+        tasks = {primary}
+        delay = self.hedger.delay()
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done and self.hedger.try_spend():
+                    target = (
+                        LLM(config_name=self.hedge_profile)
+                        if self.hedge_profile
+                        else self
+                    )
+                    logger.info(
+                        f"Hedging slow request after {delay:.2f}s via '{self.hedge_profile or 'same profile'}'"
+                    )
+                    tasks.add(
+                        asyncio.create_task(
+                            target._create_completion(prompt_tokens, **params)
+                        )
+                    )
+
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        response = task.result()
+                        if response.choices and response.choices[0].message:
+                            if task is not primary:
+                                self.hedger.stats["hedge_wins"] += 1
+                            self.hedger.observe(time.monotonic() - start)
+                            return response
+            # Nothing valid came back: surface the primary request's outcome
+            return primary.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    @track_llm_call("ask")
     async def ask(
         self,
         messages: List[Union[dict, Message]],
         system_msgs: Optional[List[Union[dict, Message]]] = None,
         stream: bool = True,
         temperature: Optional[float] = None,
+        use_cache: bool = True,
+        sink: Optional[StreamSink] = None,
     ) -> str:
         """
         Send a prompt to the LLM and get the response.
@@ -116,56 +503,134 @@ class LLM:
             system_msgs: Optional system messages to prepend
             stream (bool): Whether to stream the response
             temperature (float): Sampling temperature for the response
+            use_cache (bool): Whether the response cache may serve this call
+            sink (StreamSink): Receives streamed text; defaults to
+                ``self.stream_sink`` or a non-blocking stdout writer. It is
+                closed when the call returns, or failed when it raises
 
         Returns:
             str: The generated response
 
         Raises:
             ValueError: If messages are invalid or response is empty
-            OpenAIError: If API call fails after retries
+            OpenAIError: If API call fails after retries, or immediately for
+                non-retryable errors such as authentication failures
             Exception: For unexpected errors
         """
+        if not stream:
+            return await self._ask(messages, system_msgs, False, temperature, use_cache)
+        # The sink ends exactly once, however the call ends, so readers never hang
+        sink = sink or self.stream_sink or StdoutSink()
+        try:
+            result = await self._ask(
+                messages, system_msgs, True, temperature, use_cache, sink
+            )
+        except BaseException as e:
+            await sink.fail(e)
+            raise
+        await sink.close()
+        return result
+
+    @with_retry_policy
+    async def _ask(
+        self,
+        messages: List[Union[dict, Message]],
+        system_msgs: Optional[List[Union[dict, Message]]],
+        stream: bool,
+        temperature: Optional[float],
+        use_cache: bool,
+        sink: Optional[StreamSink] = None,
+    ) -> str:
+        """One attempt at ask; streamed text goes to sink, which the caller closes.
+
+        Once any text has reached the sink a failure is not retried, because
+        a retry would send the same text again.
+        """
         try:
             # Format system and user messages
-            if system_msgs:
-                system_msgs = self.format_messages(system_msgs)
-                messages = system_msgs + self.format_messages(messages)
-            else:
-                messages = self.format_messages(messages)
+            messages, report = self._prepare_messages(messages, system_msgs)
 
-            if not stream:
-                # Non-streaming request
-                response = await self.client.chat.completions.create(
-                    model=self.model,
-                    messages=messages,
-                    max_tokens=self.max_tokens,
-                    temperature=temperature or self.temperature,
-                    stream=False,
-                )
-                if not response.choices or not response.choices[0].message.content:
-                    raise ValueError("Empty or invalid response from LLM")
-                return response.choices[0].message.content
+            temperature = temperature if temperature is not None else self.temperature
+            cassette_request = self._cassette_request(temperature, messages=messages)
+            replayed = self._replay("ask", cassette_request)
+            if replayed is not None:
+                if stream:
+                    await sink.send(replayed)
+                return replayed
 
-            # Streaming request
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                max_tokens=self.max_tokens,
-                temperature=temperature or self.temperature,
-                stream=True,
+            cache_key = (
+                self._cache_key("ask", temperature, messages=messages)
+                if use_cache
+                else None
             )
+            if cache_key:
+                cached = await self.cache.aget(cache_key)
+                if cached is not None:
+                    logger.debug(f"LLM cache hit for ask ({cache_key[:12]})")
+                    self._mark_call_source("cache")
+                    if stream:
+                        await sink.send(cached)
+                    self._record("ask", cassette_request, cached)
+                    return cached
+
+            async def fetch() -> str:
+                if not stream:
+                    # Non-streaming request
+                    response = await self._create_completion(
+                        report.total,
+                        messages=messages,
+                        max_tokens=self.max_tokens,
+                        temperature=temperature,
+                        stream=False,
+                    )
+                    if not response.choices or not response.choices[0].message.content:
+                        raise ValueError("Empty or invalid response from LLM")
+                    return response.choices[0].message.content
 
-            collected_messages = []
-            async for chunk in response:
-                chunk_message = chunk.choices[0].delta.content or ""
-                collected_messages.append(chunk_message)
-                print(chunk_message, end="", flush=True)
+                # Streaming request
+                async with self._connection(report.total) as (endpoint, lease):
+                    response = await endpoint.client.chat.completions.create(
+                        model=endpoint.model,
+                        messages=messages,
+                        max_tokens=self.max_tokens,
+                        temperature=temperature,
+                        stream=True,
+                    )
 
-            print()  # Newline after streaming
-            full_response = "".join(collected_messages).strip()
-            if not full_response:
-                raise ValueError("Empty response from streaming LLM")
-            return full_response
+                    collected_messages = []
+                    call = current_call()
+                    try:
+                        async for chunk in response:
+                            lease.mark_first_token()
+                            if call is not None:
+                                call.mark_first_token()
+                            chunk_message = chunk.choices[0].delta.content or ""
+                            collected_messages.append(chunk_message)
+                            if chunk_message:
+                                await sink.send(chunk_message)
+                    except Exception as e:
+                        if any(collected_messages):
+                            raise disable_retry(e)
+                        raise
+
+                    full_response = "".join(collected_messages).strip()
+                    lease.record_usage(
+                        self._record_streamed_usage(report.total, full_response)
+                    )
+                if not full_response:
+                    raise ValueError("Empty response from streaming LLM")
+                return full_response
+
+            flight_key = self._request_key("ask", temperature, messages=messages)
+            coalesced = self.coalesce_requests and flight_key in self.singleflight
+            result = await self._coalesce(flight_key, fetch)
+            if stream and coalesced:
+                # Another caller streamed this response; deliver it in one piece
+                await sink.send(result)
+            if cache_key:
+                await self.cache.aset(cache_key, result)
+            self._record("ask", cassette_request, result)
+            return result
 
         except ValueError as ve:
             logger.error(f"Validation error: {ve}")
@@ -177,23 +642,25 @@ class LLM:
             logger.error(f"Unexpected error in ask: {e}")
             raise
 
-    @retry(
-        wait=wait_random_exponential(min=1, max=60),
-        stop=stop_after_attempt(6),
-    )
     async def ask_tool(
         self,
         messages: List[Union[dict, Message]],
         system_msgs: Optional[List[Union[dict, Message]]] = None,
         timeout: int = 300,
         tools: Optional[List[dict]] = None,
-        tool_choice: TOOL_CHOICE_TYPE = ToolChoice.AUTO, # type: ignore
+        tool_choice: TOOL_CHOICE_TYPE = ToolChoice.AUTO,  # type: ignore
         temperature: Optional[float] = None,
+        use_cache: bool = True,
+        validator: Optional[CascadeValidator] = None,
         **kwargs,
     ):
         """
         Ask LLM using functions/tools and return the response.
 
+        When this profile has ``cascade_profiles``, those cheaper profiles are
+        tried first and the request escalates while their response is empty,
+        has malformed tool arguments, names an unknown tool or fails validator.
+
         Args:
             messages: List of conversation messages
             system_msgs: Optional system messages to prepend
@@ -201,6 +668,9 @@ class LLM:
             tools: List of tools to use
             tool_choice: Tool choice strategy
             temperature: Sampling temperature for the response
+            use_cache: Whether the response cache may serve this call
+            validator: Cascade check that accepts (True) or rejects a response;
+                defaults to ``self.cascade.validator``
             **kwargs: Additional completion arguments
 
         Returns:
@@ -208,45 +678,122 @@ class LLM:
 
         Raises:
             ValueError: If tools, tool_choice, or messages are invalid
-            OpenAIError: If API call fails after retries
+            OpenAIError: If API call fails after retries, or immediately for
+                non-retryable errors such as authentication failures
             Exception: For unexpected errors
         """
+        request = dict(
+            messages=messages,
+            system_msgs=system_msgs,
+            timeout=timeout,
+            tools=tools,
+            tool_choice=tool_choice,
+            temperature=temperature,
+            use_cache=use_cache,
+            **kwargs,
+        )
+        if self.cascade is not None:
+            return await self.cascade.ask_tool(validator=validator, **request)
+        return await self._ask_tool(**request)
+
+    @track_llm_call("ask_tool")
+    @with_retry_policy
+    async def _ask_tool(
+        self,
+        messages: List[Union[dict, Message]],
+        system_msgs: Optional[List[Union[dict, Message]]] = None,
+        timeout: int = 300,
+        tools: Optional[List[dict]] = None,
+        tool_choice: TOOL_CHOICE_TYPE = ToolChoice.AUTO,  # type: ignore
+        temperature: Optional[float] = None,
+        use_cache: bool = True,
+        accept: Optional[CascadeValidator] = None,
+        **kwargs,
+    ):
+        """ask_tool against this profile alone, without the cascade.
+
+        ``accept`` is the cascade's check of the response; a fresh response it
+        rejects is not cached, so the next identical request asks again.
+        """
         try:
             # Validate tool_choice
             if tool_choice not in TOOL_CHOICE_VALUES:
                 raise ValueError(f"Invalid tool_choice: {tool_choice}")
 
-            # Format messages
-            if system_msgs:
-                system_msgs = self.format_messages(system_msgs)
-                messages = system_msgs + self.format_messages(messages)
-            else:
-                messages = self.format_messages(messages)
-
             # Validate tools if provided
             if tools:
                 for tool in tools:
                     if not isinstance(tool, dict) or "type" not in tool:
                         raise ValueError("Each tool must be a dict with 'type' field")
 
-            # Set up the completion request
-            response = await self.client.chat.completions.create(
-                model=self.model,
+            # Format messages
+            messages, report = self._prepare_messages(messages, system_msgs, tools)
+
+            temperature = temperature if temperature is not None else self.temperature
+            cassette_request = self._cassette_request(
+                temperature,
                 messages=messages,
-                temperature=temperature or self.temperature,
-                max_tokens=self.max_tokens,
                 tools=tools,
                 tool_choice=tool_choice,
-                timeout=timeout,
                 **kwargs,
             )
+            replayed = self._replay("ask_tool", cassette_request)
+            if replayed is not None:
+                return ChatCompletionMessage.model_validate(replayed)
 
-            # Check if response is valid
-            if not response.choices or not response.choices[0].message:
-                print(response)
-                raise ValueError("Invalid or empty response from LLM")
+            cache_key = (
+                self._cache_key(
+                    "ask_tool",
+                    temperature,
+                    messages=messages,
+                    tools=tools,
+                    tool_choice=tool_choice,
+                    **kwargs,
+                )
+                if use_cache
+                else None
+            )
+            if cache_key:
+                cached = await self.cache.aget(cache_key)
+                if cached is not None:
+                    logger.debug(f"LLM cache hit for ask_tool ({cache_key[:12]})")
+                    self._mark_call_source("cache")
+                    self._record("ask_tool", cassette_request, cached)
+                    return ChatCompletionMessage.model_validate(cached)
 
-            return response.choices[0].message
+            async def fetch() -> ChatCompletionMessage:
+                # Set up the completion request
+                response = await self._hedged_completion(
+                    report.total,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=self.max_tokens,
+                    tools=tools,
+                    tool_choice=tool_choice,
+                    timeout=timeout,
+                    **kwargs,
+                )
+
+                # Check if response is valid
+                if not response.choices or not response.choices[0].message:
+                    logger.debug(f"Invalid response from LLM: {response}")
+                    raise ValueError("Invalid or empty response from LLM")
+                return response.choices[0].message
+
+            flight_key = self._request_key(
+                "ask_tool",
+                temperature,
+                messages=messages,
+                tools=tools,
+                tool_choice=tool_choice,
+                **kwargs,
+            )
+            message = await self._coalesce(flight_key, fetch)
+            if cache_key and (accept is None or accept(message)):
+                await self.cache.aset(cache_key, message.model_dump())
+            self._record("ask_tool", cassette_request, message.model_dump())
+            # Callers may mutate the message, so each gets its own copy
+            return message.model_copy(deep=True)
 
         except ValueError as ve:
             logger.error(f"Validation error in ask_tool: {ve}")
@@ -263,13 +810,487 @@ class LLM:
             logger.error(f"Unexpected error in ask_tool: {e}")
             raise
 
+    @property
+    def supports_structured_output(self) -> bool:
+        """Whether ask_json is enabled for this profile."""
+        return self.structured_output != "off"
+
+    @track_llm_call("ask_json")
+    @with_retry_policy
+    async def ask_json(
+        self,
+        messages: List[Union[dict, Message]],
+        schema: Dict[str, Any],
+        name: str = "response",
+        system_msgs: Optional[List[Union[dict, Message]]] = None,
+        timeout: int = 300,
+        temperature: Optional[float] = None,
+        use_cache: bool = True,
+    ) -> Dict[str, Any]:
+        """
+        Ask for a JSON object matching schema and return it decoded.
+
+        The schema goes out as a strict ``response_format`` JSON schema, which
+        takes fewer prompt tokens than a tool definition. When the endpoint
+        rejects the response_format itself, the profile falls back to plain
+        JSON mode with the schema in the system prompt; other 400 errors are
+        raised. Either way the reply is validated locally, including the
+        keywords strict mode does not accept, before it is returned.
+
+        Args:
+            messages: List of conversation messages
+            schema: JSON schema the response must match
+            name: Name of the schema, as sent to the endpoint
+            system_msgs: Optional system messages to prepend
+            timeout: Request timeout in seconds
+            temperature: Sampling temperature for the response
+            use_cache: Whether the response cache may serve this call
+
+        Returns:
+            Dict[str, Any]: The decoded response
+
+        Raises:
+            StructuredOutputError: If structured output is off for this profile,
+                or the reply is not JSON matching schema
+            OpenAIError: If API call fails after retries
+        """
+        if not self.supports_structured_output:
+            raise StructuredOutputError(
+                f"Structured output is disabled for profile '{self.config_name}'"
+            )
+        request = dict(
+            messages=messages,
+            schema=schema,
+            name=name,
+            system_msgs=system_msgs,
+            timeout=timeout,
+            temperature=temperature,
+            use_cache=use_cache,
+        )
+        try:
+            return await self._ask_json(self.structured_output, **request)
+        except BadRequestError as e:
+            if self.structured_output != "json_schema" or not rejects_response_format(
+                e
+            ):
+                raise
+            logger.warning(
+                f"Profile '{self.config_name}' rejected a response_format schema ({e}); "
+                "using JSON mode from now on"
+            )
+            self.structured_output = "json_object"
+            return await self._ask_json(self.structured_output, **request)
+
+    async def _ask_json(
+        self,
+        mode: str,
+        messages: List[Union[dict, Message]],
+        schema: Dict[str, Any],
+        name: str,
+        system_msgs: Optional[List[Union[dict, Message]]],
+        timeout: int,
+        temperature: Optional[float],
+        use_cache: bool,
+    ) -> Dict[str, Any]:
+        """One ask_json attempt in the given structured output mode."""
+        if mode == "json_object":
+            system_msgs = list(system_msgs or []) + [
+                Message.system_message(schema_instruction(schema))
+            ]
+        messages, report = self._prepare_messages(messages, system_msgs)
+        temperature = temperature if temperature is not None else self.temperature
+        params = dict(
+            messages=messages, response_format=response_format(mode, name, schema)
+        )
+
+        cassette_request = self._cassette_request(temperature, **params)
+        replayed = self._replay("ask_json", cassette_request)
+        if replayed is not None:
+            return parse_structured(replayed, schema)
+
+        cache_key = (
+            self._cache_key("ask_json", temperature, **params) if use_cache else None
+        )
+        if cache_key:
+            cached = await self.cache.aget(cache_key)
+            if cached is not None:
+                logger.debug(f"LLM cache hit for ask_json ({cache_key[:12]})")
+                self._mark_call_source("cache")
+                self._record("ask_json", cassette_request, cached)
+                return parse_structured(cached, schema)
+
+        async def fetch() -> str:
+            response = await self._hedged_completion(
+                report.total,
+                temperature=temperature,
+                max_tokens=self.max_tokens,
+                timeout=timeout,
+                **params,
+            )
+            if not response.choices or not response.choices[0].message.content:
+                raise ValueError("Empty or invalid response from LLM")
+            return response.choices[0].message.content
+
+        flight_key = self._request_key("ask_json", temperature, **params)
+        content = await self._coalesce(flight_key, fetch)
+        # Validate before caching so a bad reply is not served again
+        result = parse_structured(content, schema)
+        if cache_key:
+            await self.cache.aset(cache_key, content)
+        self._record("ask_json", cassette_request, content)
+        return result
+
+    @with_retry_policy
+    async def _open_stream(self, endpoint: "LLM", **params):
+        """Open a streaming completion, retrying only until the stream starts."""
+        try:
+            return await endpoint.client.chat.completions.create(
+                model=endpoint.model, stream=True, **params
+            )
+        except RateLimitError:
+            endpoint.rate_limiter.on_rate_limited()
+            raise
+
+    @track_llm_call("ask_tool_stream")
+    async def ask_tool_stream(
+        self,
+        messages: List[Union[dict, Message]],
+        system_msgs: Optional[List[Union[dict, Message]]] = None,
+        timeout: int = 300,
+        tools: Optional[List[dict]] = None,
+        tool_choice: TOOL_CHOICE_TYPE = ToolChoice.AUTO,  # type: ignore
+        temperature: Optional[float] = None,
+        on_tool_call: Optional[Callable[[ChatCompletionMessageToolCall], Any]] = None,
+        use_cache: bool = True,
+        sink: Optional[StreamSink] = None,
+        **kwargs,
+    ) -> ChatCompletionMessage:
+        """
+        Streaming variant of ask_tool that dispatches tool calls early.
+
+        Tool calls are rebuilt from the streamed deltas. Each one is handed to
+        ``on_tool_call`` as soon as its arguments form a complete JSON object
+        (or the model moves on to the next call), in the order the model
+        emitted them, while the rest of the completion is still streaming.
+
+        Only opening the stream is retried: once a tool call has been
+        dispatched, errors propagate so that no tool is started twice.
+
+        Args:
+            messages: List of conversation messages
+            system_msgs: Optional system messages to prepend
+            timeout: Request timeout in seconds
+            tools: List of tools to use
+            tool_choice: Tool choice strategy
+            temperature: Sampling temperature for the response
+            on_tool_call: Callback (sync or async) receiving each completed tool call
+            use_cache: Whether the response cache may serve this call
+            sink: Optional StreamSink receiving the text content as it streams;
+                closed when the call returns, or failed when it raises
+            **kwargs: Additional completion arguments
+
+        Returns:
+            ChatCompletionMessage: The assembled response, as returned by ask_tool
+
+        Raises:
+            ValueError: If tools, tool_choice, or messages are invalid
+            OpenAIError: If the API call fails
+        """
+        request = dict(
+            messages=messages,
+            system_msgs=system_msgs,
+            timeout=timeout,
+            tools=tools,
+            tool_choice=tool_choice,
+            temperature=temperature,
+            on_tool_call=on_tool_call,
+            use_cache=use_cache,
+            **kwargs,
+        )
+        if sink is None:
+            return await self._ask_tool_stream(**request)
+        # The sink ends exactly once, however the call ends, so readers never hang
+        try:
+            message = await self._ask_tool_stream(sink=sink, **request)
+        except BaseException as e:
+            await sink.fail(e)
+            raise
+        await sink.close()
+        return message
+
+    async def _ask_tool_stream(
+        self,
+        messages: List[Union[dict, Message]],
+        system_msgs: Optional[List[Union[dict, Message]]],
+        timeout: int,
+        tools: Optional[List[dict]],
+        tool_choice: TOOL_CHOICE_TYPE,  # type: ignore
+        temperature: Optional[float],
+        on_tool_call: Optional[Callable[[ChatCompletionMessageToolCall], Any]],
+        use_cache: bool,
+        sink: Optional[StreamSink] = None,
+        **kwargs,
+    ) -> ChatCompletionMessage:
+        """ask_tool_stream without ending the sink, which the caller does."""
+        if tool_choice not in TOOL_CHOICE_VALUES:
+            raise ValueError(f"Invalid tool_choice: {tool_choice}")
+
+        if tools:
+            for tool in tools:
+                if not isinstance(tool, dict) or "type" not in tool:
+                    raise ValueError("Each tool must be a dict with 'type' field")
+
+        async def dispatch(call: ChatCompletionMessageToolCall) -> None:
+            if on_tool_call is None:
+                return
+            result = on_tool_call(call)
+            if inspect.isawaitable(result):
+                await result
+
+        if self.cascade is not None:
+            # A cheap tier's tool calls cannot be taken back once dispatched, so
+            # the cascade answers first and the accepted calls are dispatched after
+            self._mark_call_source("cascade")
+            message = await self.ask_tool(
+                messages,
+                system_msgs=system_msgs,
+                timeout=timeout,
+                tools=tools,
+                tool_choice=tool_choice,
+                temperature=temperature,
+                use_cache=use_cache,
+                **kwargs,
+            )
+            if sink is not None and message.content:
+                await sink.send(message.content)
+            for call in message.tool_calls or []:
+                await dispatch(call)
+            return message
+
+        messages, report = self._prepare_messages(messages, system_msgs, tools)
+
+        temperature = temperature if temperature is not None else self.temperature
+        # Recorded under ask_tool, so streaming and non-streaming runs share cassettes
+        cassette_request = self._cassette_request(
+            temperature,
+            messages=messages,
+            tools=tools,
+            tool_choice=tool_choice,
+            **kwargs,
+        )
+        replayed = self._replay("ask_tool", cassette_request)
+        if replayed is not None:
+            message = ChatCompletionMessage.model_validate(replayed)
+            if sink is not None and message.content:
+                await sink.send(message.content)
+            for call in message.tool_calls or []:
+                await dispatch(call)
+            return message
+
+        cache_key = (
+            self._cache_key(
+                "ask_tool",
+                temperature,
+                messages=messages,
+                tools=tools,
+                tool_choice=tool_choice,
+                **kwargs,
+            )
+            if use_cache
+            else None
+        )
+        if cache_key:
+            cached = await self.cache.aget(cache_key)
+            if cached is not None:
+                logger.debug(f"LLM cache hit for ask_tool_stream ({cache_key[:12]})")
+                self._mark_call_source("cache")
+                self._record("ask_tool", cassette_request, cached)
+                message = ChatCompletionMessage.model_validate(cached)
+                if sink is not None and message.content:
+                    await sink.send(message.content)
+                for call in message.tool_calls or []:
+                    await dispatch(call)
+                return message
+
+        try:
+            content_parts: List[str] = []
+            # index -> partially assembled tool call
+            pending: Dict[int, Dict[str, Any]] = {}
+            completed: List[ChatCompletionMessageToolCall] = []
+
+            async def flush(final: bool = False) -> None:
+                # Dispatch in emission order, stopping at the first unfinished call
+                while len(completed) in pending:
+                    index = len(completed)
+                    entry = pending[index]
+                    arguments = "".join(entry["arguments"])
+                    if not (
+                        final
+                        or (index + 1) in pending
+                        or self._is_complete_json(arguments)
+                    ):
+                        break
+                    call = ChatCompletionMessageToolCall(
+                        id=entry["id"],
+                        type="function",
+                        function=Function(name=entry["name"], arguments=arguments),
+                    )
+                    completed.append(call)
+                    await dispatch(call)
+
+            async with self._connection(report.total) as (endpoint, lease):
+                response = await self._open_stream(
+                    endpoint,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=self.max_tokens,
+                    tools=tools,
+                    tool_choice=tool_choice,
+                    timeout=timeout,
+                    **kwargs,
+                )
+
+                call = current_call()
+                async for chunk in response:
+                    lease.mark_first_token()
+                    if call is not None:
+                        call.mark_first_token()
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta
+                    if delta.content:
+                        content_parts.append(delta.content)
+                        if sink is not None:
+                            await sink.send(delta.content)
+                    for tool_delta in delta.tool_calls or []:
+                        entry = pending.setdefault(
+                            tool_delta.index, {"id": "", "name": "", "arguments": []}
+                        )
+                        if tool_delta.id:
+                            entry["id"] = tool_delta.id
+                        if tool_delta.function:
+                            if tool_delta.function.name:
+                                entry["name"] += tool_delta.function.name
+                            if tool_delta.function.arguments:
+                                entry["arguments"].append(tool_delta.function.arguments)
+                    if delta.tool_calls:
+                        await flush()
+
+                await flush(final=True)
+                completion_text = "".join(content_parts) + "".join(
+                    call.function.arguments for call in completed
+                )
+                lease.record_usage(
+                    self._record_streamed_usage(report.total, completion_text)
+                )
+
+            content = "".join(content_parts) or None
+            if content is None and not completed:
+                raise ValueError("Invalid or empty response from LLM")
+
+            message = ChatCompletionMessage(
+                role="assistant", content=content, tool_calls=completed or None
+            )
+            if cache_key:
+                await self.cache.aset(cache_key, message.model_dump())
+            self._record("ask_tool", cassette_request, message.model_dump())
+            return message
+
+        except ValueError as ve:
+            logger.error(f"Validation error in ask_tool_stream: {ve}")
+            raise
+        except OpenAIError as oe:
+            logger.error(f"OpenAI API error in ask_tool_stream: {oe}")
+            raise
+        except Exception as e:
+            logger.error(f"Unexpected error in ask_tool_stream: {e}")
+            raise
+
+    def _batch(
+        self,
+        method: Callable,
+        requests: List[Union[List[Union[dict, Message]], Dict[str, Any]]],
+        concurrency: Optional[int],
+        **defaults,
+    ) -> AsyncIterator[BatchResult]:
+        def make_call(request):
+            kwargs = (
+                dict(request) if isinstance(request, dict) else {"messages": request}
+            )
+            for key, value in defaults.items():
+                kwargs.setdefault(key, value)
+            return lambda: method(**kwargs)
+
+        return run_bounded(
+            [make_call(request) for request in requests],
+            concurrency or self.rate_limiter.max_concurrency,
+        )
+
+    def ask_many(
+        self,
+        requests: List[Union[List[Union[dict, Message]], Dict[str, Any]]],
+        concurrency: Optional[int] = None,
+    ) -> AsyncIterator[BatchResult]:
+        """
+        Run independent ask calls concurrently, yielding each as it completes.
+
+        Every call still goes through this profile's rate limiter, which may
+        hold it further while the endpoint is saturated.
+
+        Args:
+            requests: Each item is a message list, or a dict of ask() keyword
+                arguments; ``stream`` defaults to False
+            concurrency: Maximum calls in flight; defaults to the profile's
+                max_concurrency
+
+        Yields:
+            BatchResult: ``index`` is the request position; ``result`` holds the
+            response text, or ``error`` the exception that call raised
+
+        Examples:
+            >>> async for item in llm.ask_many([[Message.user_message(q)] for q in questions]):
+            ...     answers[item.index] = item.result if item.ok else None
+        """
+        return self._batch(self.ask, requests, concurrency, stream=False)
+
+    def ask_tool_many(
+        self,
+        requests: List[Union[List[Union[dict, Message]], Dict[str, Any]]],
+        concurrency: Optional[int] = None,
+    ) -> AsyncIterator[BatchResult]:
+        """
+        Run independent ask_tool calls concurrently, yielding each as it completes.
+
+        Args:
+            requests: Each item is a message list, or a dict of ask_tool()
+                keyword arguments
+            concurrency: Maximum calls in flight; defaults to the profile's
+                max_concurrency
+
+        Yields:
+            BatchResult: ``index`` is the request position; ``result`` holds the
+            ChatCompletionMessage, or ``error`` the exception that call raised
+        """
+        return self._batch(self.ask_tool, requests, concurrency)
+
+    @staticmethod
+    def _is_complete_json(arguments: str) -> bool:
+        """Check whether streamed tool arguments already form a JSON object."""
+        if not arguments.rstrip().endswith("}"):
+            return False
+        try:
+            return isinstance(json.loads(arguments), dict)
+        except json.JSONDecodeError:
+            return False
+
+
 def get_llm(config_name: str = "default") -> LLM:
     """
     Get an instance of the LLM class.
-    
+
     Args:
         config_name: The name of the configuration to use
-        
+
     Returns:
         An instance of the LLM class
     """
@@ -0,0 +1,145 @@
+"""Append-only JSONL transcripts of agent memory, paged in on demand."""
+import json
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.config import PROJECT_ROOT, config
+
+
+class MemoryStore:
+    """The durable transcript of one memory session as a JSONL file.
+
+    Every change to the memory is appended as one line as it happens:
+
+        {"seq": 0, "op": "add", "message": {...}}
+        {"seq": 7, "op": "compact", "through": 4, "message": {...}}
+        {"seq": 8, "op": "drop", "seqs": [3, 5]}
+        {"seq": 9, "op": "clear"}
+
+    ``compact`` replaces every message up to seq ``through`` with its summary
+    message, and ``drop`` removes the messages added as ``seqs``. Records
+    are only ever appended, so the file is the full audit trail. Only the
+    byte offset of every ``page_size``-th record stays in memory; records are
+    read back a page at a time, and a few recent pages are cached.
+    """
+
+    def __init__(self, path: Path, page_size: int = 256, cached_pages: int = 4):
+        self.path = Path(path)
+        self.page_size = page_size
+        self.cached_pages = cached_pages
+        self._lock = threading.Lock()
+        # byte offset of records 0, page_size, 2 * page_size, ...
+        self._page_offsets: List[int] = []
+        self._pages: "OrderedDict[int, List[Dict[str, Any]]]" = OrderedDict()
+        self._count = 0
+        self._size = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.path.exists():
+            self._scan()
+
+    @classmethod
+    def for_session(cls, session_id: str) -> Optional["MemoryStore"]:
+        """The store of a session in the configured directory, or None if storing is off."""
+        settings = config.memory
+        if not settings.store_directory:
+            return None
+        directory = Path(settings.store_directory)
+        if not directory.is_absolute():
+            directory = PROJECT_ROOT / directory
+        return cls(directory / f"{session_id}.jsonl", page_size=settings.page_size)
+
+    def _scan(self) -> None:
+        """Index the record offsets of an existing file without keeping its records."""
+        offset = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # A torn final write: drop it so new records start on a fresh line
+                    break
+                if self._count % self.page_size == 0:
+                    self._page_offsets.append(offset)
+                self._count += 1
+                offset += len(line)
+        if offset != self.path.stat().st_size:
+            with open(self.path, "r+b") as f:
+                f.truncate(offset)
+        self._size = offset
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(
+        self,
+        op: str,
+        message: Optional[Dict[str, Any]] = None,
+        through: Optional[int] = None,
+        seqs: Optional[List[int]] = None,
+    ) -> int:
+        """
+        Write one record and return its seq.
+
+        Args:
+            op: "add", "compact", "drop" or "clear"
+            message: The added message, or the summary of a compaction
+            through: Last seq a compaction replaces
+            seqs: Seqs of the messages a drop removes
+
+        Returns:
+            int: The seq of the new record
+        """
+        with self._lock:
+            seq = self._count
+            record: Dict[str, Any] = {"seq": seq, "op": op}
+            if through is not None:
+                record["through"] = through
+            if seqs is not None:
+                record["seqs"] = seqs
+            if message is not None:
+                record["message"] = message
+            line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+            # Opened per record so many idle sessions hold no file handles
+            with open(self.path, "ab") as f:
+                f.write(line)
+            if seq % self.page_size == 0:
+                self._page_offsets.append(self._size)
+            self._count += 1
+            self._size += len(line)
+            # The last page is growing; drop its cached copy
+            self._pages.pop(seq // self.page_size, None)
+            return seq
+
+    def _page(self, page: int) -> List[Dict[str, Any]]:
+        cached = self._pages.get(page)
+        if cached is not None:
+            self._pages.move_to_end(page)
+            return cached
+        records = []
+        with open(self.path, "rb") as f:
+            f.seek(self._page_offsets[page])
+            for _ in range(self.page_size):
+                line = f.readline()
+                if not line:
+                    break
+                records.append(json.loads(line))
+        self._pages[page] = records
+        while len(self._pages) > self.cached_pages:
+            self._pages.popitem(last=False)
+        return records
+
+    def read(
+        self, start: int = 0, stop: Optional[int] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """Records with start <= seq < stop, paged in from disk as iteration reaches them."""
+        stop = self._count if stop is None else min(stop, self._count)
+        seq = max(start, 0)
+        while seq < stop:
+            page = seq // self.page_size
+            with self._lock:
+                records = self._page(page)
+            for record in records[
+                seq - page * self.page_size : stop - page * self.page_size
+            ]:
+                yield record
+            seq = (page + 1) * self.page_size
@@ -0,0 +1,339 @@
+"""In-process metrics for LLM calls, exportable as Prometheus text or JSON."""
+import functools
+import json
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+from app.ledger import current_ledger
+
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+TOKEN_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768, 65536, 131072)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """A cumulative-bucket histogram in the Prometheus style."""
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile by interpolating inside the matching bucket."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                estimate = lower + (upper - lower) * (rank - seen) / bucket_count
+                return min(max(estimate, self.min), self.max)
+            seen += bucket_count
+        return self.max
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else None,
+            "min": self.min,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "max": self.max,
+        }
+
+
+class LLMCall(BaseModel):
+    """Measurements for one logical LLM call, including its retries."""
+
+    profile: str
+    method: str
+    endpoint: Optional[str] = None
+    source: str = Field(
+        "network", description="network, cache, coalesced, cassette or cascade"
+    )
+    started: float = Field(default_factory=time.monotonic)
+    first_token_at: Optional[float] = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    retries: int = 0
+
+    def mark_first_token(self) -> None:
+        if self.first_token_at is None:
+            self.first_token_at = time.monotonic()
+
+    def record_usage(self, usage: Any) -> None:
+        """Add token counts from an OpenAI ``usage`` object."""
+        if usage is None:
+            return
+        self.prompt_tokens += usage.prompt_tokens or 0
+        self.completion_tokens += usage.completion_tokens or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        if details is not None and getattr(details, "cached_tokens", None):
+            self.cached_tokens += details.cached_tokens
+        elif getattr(usage, "prompt_cache_hit_tokens", None):
+            # DeepSeek reports prefix cache hits as a top-level usage field
+            self.cached_tokens += usage.prompt_cache_hit_tokens
+
+
+_current_call: ContextVar[Optional[LLMCall]] = ContextVar(
+    "current_llm_call", default=None
+)
+
+
+def current_call() -> Optional[LLMCall]:
+    """The LLMCall being measured in the current task, if any."""
+    return _current_call.get()
+
+
+class MetricsRegistry:
+    """Thread-safe registry of labelled counters and histograms."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self._help: Dict[str, str] = {}
+        self.started_at = time.time()
+
+    @staticmethod
+    def _labels(labels: Dict[str, str]) -> Labels:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name: str, value: float = 1, help: str = "", **labels) -> None:
+        with self._lock:
+            self._help.setdefault(name, help)
+            series = self._counters.setdefault(name, {})
+            key = self._labels(labels)
+            series[key] = series.get(key, 0) + value
+
+    def observe(
+        self,
+        name: str,
+        value: float,
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS,
+        help: str = "",
+        **labels,
+    ) -> None:
+        with self._lock:
+            self._help.setdefault(name, help)
+            series = self._histograms.setdefault(name, {})
+            key = self._labels(labels)
+            if key not in series:
+                series[key] = Histogram(buckets)
+            series[key].observe(value)
+
+    def record_llm_call(self, call: LLMCall, status: str) -> None:
+        """Fold one finished LLM call into the registry."""
+        labels = {"profile": call.profile, "method": call.method}
+        now = time.monotonic()
+        self.inc(
+            "llm_requests_total",
+            help="LLM calls by outcome",
+            status=status,
+            source=call.source,
+            endpoint=call.endpoint or call.profile,
+            **labels,
+        )
+        self.observe(
+            "llm_request_latency_seconds",
+            now - call.started,
+            help="Total LLM call latency including retries",
+            **labels,
+        )
+        if call.first_token_at is not None:
+            self.observe(
+                "llm_time_to_first_token_seconds",
+                call.first_token_at - call.started,
+                help="Time to the first streamed token",
+                **labels,
+            )
+        if call.retries:
+            self.inc(
+                "llm_retries_total", call.retries, help="LLM call retries", **labels
+            )
+        if call.source != "network":
+            return
+        for kind, value in (
+            ("prompt", call.prompt_tokens),
+            ("completion", call.completion_tokens),
+            ("cached", call.cached_tokens),
+        ):
+            self.inc(
+                f"llm_{kind}_tokens_total",
+                value,
+                help=f"{kind.capitalize()} tokens",
+                **labels,
+            )
+        self.observe(
+            "llm_prompt_tokens",
+            call.prompt_tokens,
+            buckets=TOKEN_BUCKETS,
+            help="Prompt tokens per call",
+            **labels,
+        )
+        self.observe(
+            "llm_completion_tokens",
+            call.completion_tokens,
+            buckets=TOKEN_BUCKETS,
+            help="Completion tokens per call",
+            **labels,
+        )
+
+    @staticmethod
+    def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(labels) + ([extra] if extra else [])
+        if not pairs:
+            return ""
+        escaped = [
+            '{}="{}"'.format(
+                k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            )
+            for k, v in pairs
+        ]
+        return "{" + ",".join(escaped) + "}"
+
+    def to_prometheus(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# HELP {name} {self._help.get(name, '')}")
+                lines.append(f"# TYPE {name} counter")
+                for labels, value in series.items():
+                    lines.append(f"{name}{self._format_labels(labels)} {value}")
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# HELP {name} {self._help.get(name, '')}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, hist in series.items():
+                    cumulative = 0
+                    for bound, count in zip(
+                        hist.buckets + (float("inf"),), hist.counts
+                    ):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else f"{bound}"
+                        lines.append(
+                            f"{name}_bucket{self._format_labels(labels, ('le', le))} {cumulative}"
+                        )
+                    lines.append(f"{name}_sum{self._format_labels(labels)} {hist.sum}")
+                    lines.append(
+                        f"{name}_count{self._format_labels(labels)} {hist.count}"
+                    )
+        return "\n".join(lines) + "\n"
+
+    def prompt_cache_report(self) -> Dict[str, Dict[str, float]]:
+        """Prompt and cached prompt tokens per profile, with the cache hit rate."""
+        report: Dict[str, Dict[str, float]] = {}
+        with self._lock:
+            for kind in ("prompt", "cached"):
+                for labels, value in self._counters.get(
+                    f"llm_{kind}_tokens_total", {}
+                ).items():
+                    profile = dict(labels).get("profile", "")
+                    entry = report.setdefault(
+                        profile, {"prompt_tokens": 0, "cached_tokens": 0}
+                    )
+                    entry[f"{kind}_tokens"] += value
+        for entry in report.values():
+            prompt = entry["prompt_tokens"]
+            entry["hit_rate"] = (
+                round(entry["cached_tokens"] / prompt, 4) if prompt else 0.0
+            )
+        return report
+
+    def summary(self) -> Dict[str, Any]:
+        """A JSON-serializable summary of the run."""
+        prompt_cache = self.prompt_cache_report()
+        with self._lock:
+            return {
+                "started_at": self.started_at,
+                "duration_seconds": round(time.time() - self.started_at, 3),
+                "prompt_cache": prompt_cache,
+                "counters": {
+                    name: [
+                        {"labels": dict(labels), "value": value}
+                        for labels, value in series.items()
+                    ]
+                    for name, series in self._counters.items()
+                },
+                "histograms": {
+                    name: [
+                        {"labels": dict(labels), **hist.summary()}
+                        for labels, hist in series.items()
+                    ]
+                    for name, series in self._histograms.items()
+                },
+            }
+
+    def write_reports(self, directory: Path, name: str) -> Tuple[Path, Path]:
+        """Write the JSON summary and Prometheus dump for this run.
+
+        Returns:
+            The paths of the JSON and Prometheus files
+        """
+        directory.mkdir(parents=True, exist_ok=True)
+        json_path = directory / f"{name}.json"
+        prom_path = directory / f"{name}.prom"
+        json_path.write_text(json.dumps(self.summary(), indent=2), encoding="utf-8")
+        prom_path.write_text(self.to_prometheus(), encoding="utf-8")
+        return json_path, prom_path
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self.started_at = time.time()
+
+
+metrics = MetricsRegistry()
+
+
+def track_llm_call(method: str) -> Callable:
+    """Decorate an LLM coroutine method so each call is measured.
+
+    Must wrap the retry decorator so one measurement covers all attempts.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            call = LLMCall(profile=self.config_name, method=method)
+            token = _current_call.set(call)
+            status = "error"
+            try:
+                result = await func(self, *args, **kwargs)
+                status = "ok"
+                return result
+            finally:
+                _current_call.reset(token)
+                metrics.record_llm_call(call, status)
+                ledger = current_ledger()
+                if ledger is not None:
+                    ledger.record(call)
+
+        return wrapper
+
+    return decorator
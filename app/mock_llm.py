@@ -0,0 +1,390 @@
+"""A local OpenAI-compatible chat-completions server for offline load testing.
+
+The server plays back scripted (or recorded) assistant messages with
+configurable latency and injected failures, so agents and flows can be
+exercised without a live model. Point an ``[llm]`` profile at it:
+
+    [llm]
+    model = "mock"
+    base_url = "http://127.0.0.1:8765/v1"
+    api_key = "mock"
+
+and start it with ``python run_mock_llm.py --script script.yaml``.
+"""
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional, Union
+
+import yaml
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+from app.logger import logger
+from app.token_counter import estimate_tokens
+
+
+_CHUNK_PATTERN = re.compile(r"\s*\S+|\s+")
+
+
+def _sample_json(schema: Dict[str, Any], name: str = "value") -> Any:
+    """A minimal value matching schema, for default replies in JSON mode."""
+    if "enum" in schema:
+        return schema["enum"][0]
+    kind = schema.get("type", "object")
+    if isinstance(kind, list):
+        kind = kind[0]
+    if kind == "object":
+        return {
+            key: _sample_json(value, key)
+            for key, value in schema.get("properties", {}).items()
+        }
+    if kind == "array":
+        count = max(schema.get("minItems", 1), 1)
+        item = schema.get("items", {})
+        return [_sample_json(item, f"{name} {i + 1}") for i in range(count)]
+    if kind in ("integer", "number"):
+        return 0
+    if kind == "boolean":
+        return False
+    if kind == "null":
+        return None
+    return f"Mock {name}"
+
+
+class MockSettings(BaseModel):
+    """Latency and failure model of the mock server."""
+
+    model: str = Field("mock", description="Model name reported in responses")
+    ttft: float = Field(0.2, description="Seconds before the first token")
+    tokens_per_second: float = Field(
+        50.0, description="Generation speed, 0 for instant"
+    )
+    rate_limit_rate: float = Field(
+        0.0, description="Fraction of requests answered with 429"
+    )
+    retry_after: Optional[float] = Field(1.0, description="Retry-After sent with 429s")
+    server_error_rate: float = Field(
+        0.0, description="Fraction of requests answered with 500"
+    )
+    timeout_rate: float = Field(0.0, description="Fraction of requests that hang")
+    hang_seconds: float = Field(600.0, description="How long a timed-out request hangs")
+    loop: bool = Field(False, description="Restart the script when it runs out")
+    seed: Optional[int] = Field(None, description="Seed for the failure injection")
+
+
+class ScriptedToolCall(BaseModel):
+    """A tool call to return, in shorthand or recorded OpenAI form."""
+
+    id: Optional[str] = None
+    name: Optional[str] = None
+    arguments: Union[str, Dict[str, Any]] = Field(default_factory=dict)
+    function: Optional[Dict[str, Any]] = None
+
+    def to_openai(self, index: int) -> Dict[str, Any]:
+        name = self.name
+        arguments = self.arguments
+        if self.function is not None:
+            name = self.function.get("name", name)
+            arguments = self.function.get("arguments", arguments)
+        if not isinstance(arguments, str):
+            arguments = json.dumps(arguments, ensure_ascii=False)
+        return {
+            "id": self.id or f"call_{uuid.uuid4().hex[:24]}",
+            "type": "function",
+            "function": {"name": name, "arguments": arguments},
+        }
+
+
+class ScriptedResponse(BaseModel):
+    """One scripted reply: an assistant message or an injected error."""
+
+    content: Optional[str] = None
+    tool_calls: List[ScriptedToolCall] = Field(default_factory=list)
+    error: Optional[Union[int, Literal["timeout"]]] = Field(
+        None, description="HTTP status to fail with, or 'timeout' to hang"
+    )
+    retry_after: Optional[float] = None
+    ttft: Optional[float] = Field(None, description="Overrides the server ttft")
+    tokens_per_second: Optional[float] = Field(
+        None, description="Overrides the server tokens_per_second"
+    )
+
+
+class MockScript(BaseModel):
+    """Settings plus the ordered replies of a mock session."""
+
+    settings: MockSettings = Field(default_factory=MockSettings)
+    responses: List[ScriptedResponse] = Field(default_factory=list)
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "MockScript":
+        """Load a script from a YAML or JSON file."""
+        text = Path(path).read_text(encoding="utf-8")
+        return cls.model_validate(yaml.safe_load(text) or {})
+
+
+class MockLLMServer:
+    """Hands out scripted replies and renders them as chat completions."""
+
+    def __init__(self, script: Optional[MockScript] = None):
+        self.script = script or MockScript()
+        self.settings = self.script.settings
+        self._rng = random.Random(self.settings.seed)
+        self._cursor = 0
+        self.stats: Dict[str, int] = {
+            "requests": 0,
+            "streamed": 0,
+            "scripted": 0,
+            "default": 0,
+            "rate_limited": 0,
+            "server_errors": 0,
+            "timeouts": 0,
+        }
+
+    def next_response(self, body: Dict[str, Any]) -> ScriptedResponse:
+        """The next scripted reply, or a default one when the script is done."""
+        responses = self.script.responses
+        if responses and self.settings.loop:
+            self._cursor %= len(responses)
+        if self._cursor < len(responses):
+            response = responses[self._cursor]
+            self._cursor += 1
+            self.stats["scripted"] += 1
+            return response
+        self.stats["default"] += 1
+        return self.default_response(body)
+
+    @staticmethod
+    def default_response(body: Dict[str, Any]) -> ScriptedResponse:
+        """Fill in a requested JSON schema, finish the run when a terminate
+        tool is offered, and otherwise echo."""
+        response_format = body.get("response_format") or {}
+        if response_format.get("type") == "json_schema":
+            schema = response_format.get("json_schema", {}).get("schema", {})
+            return ScriptedResponse(content=json.dumps(_sample_json(schema)))
+        if response_format.get("type") == "json_object":
+            return ScriptedResponse(content="{}")
+        tool_names = [
+            tool.get("function", {}).get("name") for tool in body.get("tools") or []
+        ]
+        if "terminate" in tool_names:
+            return ScriptedResponse(
+                content="Task complete.",
+                tool_calls=[
+                    ScriptedToolCall(name="terminate", arguments={"status": "success"})
+                ],
+            )
+        last_user = next(
+            (
+                m.get("content")
+                for m in reversed(body.get("messages") or [])
+                if m.get("role") == "user" and isinstance(m.get("content"), str)
+            ),
+            "",
+        )
+        return ScriptedResponse(content=f"Mock response to: {last_user[:200]}")
+
+    def injected_error(self, response: ScriptedResponse) -> Optional[Union[int, str]]:
+        """The error to fail this request with, scripted or drawn at random."""
+        if response.error is not None:
+            return response.error
+        roll = self._rng.random()
+        for error, rate in (
+            (429, self.settings.rate_limit_rate),
+            (500, self.settings.server_error_rate),
+            ("timeout", self.settings.timeout_rate),
+        ):
+            if roll < rate:
+                return error
+            roll -= rate
+        return None
+
+    async def error_response(
+        self, error: Union[int, str], response: ScriptedResponse
+    ) -> JSONResponse:
+        if error == "timeout":
+            self.stats["timeouts"] += 1
+            await asyncio.sleep(self.settings.hang_seconds)
+            error = 504
+        headers = {}
+        if error == 429:
+            self.stats["rate_limited"] += 1
+            retry_after = (
+                response.retry_after
+                if response.retry_after is not None
+                else self.settings.retry_after
+            )
+            if retry_after is not None:
+                headers["retry-after"] = str(retry_after)
+            message, kind = "Rate limit reached (mock)", "rate_limit_exceeded"
+        else:
+            self.stats["server_errors"] += 1
+            message, kind = f"Injected error {error} (mock)", "server_error"
+        return JSONResponse(
+            status_code=int(error),
+            headers=headers,
+            content={"error": {"message": message, "type": kind, "code": kind}},
+        )
+
+    def _usage(self, body: Dict[str, Any], message: Dict[str, Any]) -> Dict[str, int]:
+        prompt = estimate_tokens(
+            json.dumps(body.get("messages") or [], ensure_ascii=False)
+        )
+        for extra in ("tools", "response_format"):
+            if body.get(extra):
+                prompt += estimate_tokens(json.dumps(body[extra], ensure_ascii=False))
+        completion = estimate_tokens(message.get("content") or "")
+        for call in message.get("tool_calls") or []:
+            completion += estimate_tokens(call["function"]["name"] or "")
+            completion += estimate_tokens(call["function"]["arguments"])
+        return {
+            "prompt_tokens": prompt,
+            "completion_tokens": completion,
+            "total_tokens": prompt + completion,
+        }
+
+    @staticmethod
+    def _message(response: ScriptedResponse) -> Dict[str, Any]:
+        message: Dict[str, Any] = {"role": "assistant", "content": response.content}
+        if response.tool_calls:
+            message["tool_calls"] = [
+                call.to_openai(i) for i, call in enumerate(response.tool_calls)
+            ]
+        return message
+
+    def _pace(self, response: ScriptedResponse) -> tuple:
+        ttft = response.ttft if response.ttft is not None else self.settings.ttft
+        tps = (
+            response.tokens_per_second
+            if response.tokens_per_second is not None
+            else self.settings.tokens_per_second
+        )
+        return ttft, tps
+
+    async def complete(
+        self, body: Dict[str, Any], response: ScriptedResponse
+    ) -> Dict[str, Any]:
+        """Render a non-streaming chat completion after the simulated latency."""
+        message = self._message(response)
+        usage = self._usage(body, message)
+        ttft, tps = self._pace(response)
+        await asyncio.sleep(ttft + (usage["completion_tokens"] / tps if tps > 0 else 0))
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model") or self.settings.model,
+            "choices": [
+                {
+                    "index": 0,
+                    "message": message,
+                    "finish_reason": "tool_calls" if response.tool_calls else "stop",
+                }
+            ],
+            "usage": usage,
+        }
+
+    async def stream(
+        self, body: Dict[str, Any], response: ScriptedResponse
+    ) -> AsyncIterator[str]:
+        """Render a streaming chat completion as server-sent events."""
+        message = self._message(response)
+        usage = self._usage(body, message)
+        ttft, tps = self._pace(response)
+        base = {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": body.get("model") or self.settings.model,
+        }
+
+        def event(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> str:
+            chunk = {
+                **base,
+                "choices": [
+                    {"index": 0, "delta": delta, "finish_reason": finish_reason}
+                ],
+            }
+            return f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+
+        async def paced(text: str) -> AsyncIterator[str]:
+            for piece in _CHUNK_PATTERN.findall(text):
+                if tps > 0:
+                    await asyncio.sleep(estimate_tokens(piece) / tps)
+                yield piece
+
+        await asyncio.sleep(ttft)
+        yield event({"role": "assistant", "content": ""})
+        async for piece in paced(message.get("content") or ""):
+            yield event({"content": piece})
+        for index, call in enumerate(message.get("tool_calls") or []):
+            yield event(
+                {
+                    "tool_calls": [
+                        {
+                            "index": index,
+                            "id": call["id"],
+                            "type": "function",
+                            "function": {
+                                "name": call["function"]["name"],
+                                "arguments": "",
+                            },
+                        }
+                    ]
+                }
+            )
+            async for piece in paced(call["function"]["arguments"]):
+                yield event(
+                    {"tool_calls": [{"index": index, "function": {"arguments": piece}}]}
+                )
+        yield event({}, "tool_calls" if response.tool_calls else "stop")
+        if (body.get("stream_options") or {}).get("include_usage"):
+            yield f"data: {json.dumps({**base, 'choices': [], 'usage': usage})}\n\n"
+        yield "data: [DONE]\n\n"
+
+
+def create_app(server: Optional[MockLLMServer] = None) -> FastAPI:
+    """Build the FastAPI app that serves the mock chat-completions API."""
+    server = server or MockLLMServer()
+    app = FastAPI(title="Mock LLM")
+    app.state.mock = server
+
+    async def chat_completions(request: Request):
+        body = await request.json()
+        server.stats["requests"] += 1
+        response = server.next_response(body)
+        error = server.injected_error(response)
+        if error is not None:
+            logger.debug(f"Mock LLM injecting error {error}")
+            return await server.error_response(error, response)
+        if body.get("stream"):
+            server.stats["streamed"] += 1
+            return StreamingResponse(
+                server.stream(body, response), media_type="text/event-stream"
+            )
+        return JSONResponse(await server.complete(body, response))
+
+    async def models():
+        return {
+            "object": "list",
+            "data": [
+                {"id": server.settings.model, "object": "model", "owned_by": "mock"}
+            ],
+        }
+
+    async def stats():
+        return server.stats
+
+    for prefix in ("/v1", ""):
+        app.add_api_route(
+            f"{prefix}/chat/completions", chat_completions, methods=["POST"]
+        )
+        app.add_api_route(f"{prefix}/models", models, methods=["GET"])
+    app.add_api_route("/stats", stats, methods=["GET"])
+    return app
@@ -0,0 +1,337 @@
+"""Shared rate limiting and adaptive concurrency for LLM endpoints.
+
+One limiter per endpoint and model serves the whole process: its budgets and
+in-flight count sit behind a threading.Lock, and callers from any thread or
+event loop wait on futures of their own loop.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional, Tuple
+
+from openai import RateLimitError
+
+from app.logger import logger
+
+
+class TokenBucket:
+    """A per-minute budget that refills continuously.
+
+    Each acquire reserves its amount at once, driving the level negative
+    when the budget is spent, and then sleeps until the refill has covered
+    it. Later callers therefore wait longer, so waiters are served in arrival
+    order and a large request cannot be starved by a stream of small ones.
+    The level is guarded by a threading.Lock, so one bucket can be shared by
+    every thread and event loop.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self._level = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._level = min(
+            self.capacity, self._level + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    async def acquire(self, amount: float = 1) -> float:
+        """Take amount from the bucket, waiting until it is available.
+
+        Returns:
+            The number of seconds spent waiting
+        """
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill()
+            self._level -= amount
+            delay = max(-self._level / self.rate, 0.0)
+        if delay:
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                with self._lock:
+                    self._level += amount
+                raise
+        return delay
+
+    def consume(self, amount: float) -> None:
+        """Charge usage discovered after the fact; the level may go negative."""
+        with self._lock:
+            self._refill()
+            self._level -= amount
+
+
+class LatencyTrend:
+    """Moving average of one latency signal and its observed floor."""
+
+    def __init__(self, alpha: float, tolerance: float):
+        self.alpha = alpha
+        self.tolerance = tolerance
+        self.average: Optional[float] = None
+        self.floor: Optional[float] = None
+
+    def observe(self, value: float) -> bool:
+        """Add a sample; True when the average has drifted well above the floor."""
+        if self.average is None:
+            self.average = self.floor = value
+        else:
+            self.average += self.alpha * (value - self.average)
+            # Let the floor creep up slowly so one fast outlier does not pin it
+            self.floor = min(self.floor * 1.01, value)
+        return self.average > self.tolerance * self.floor
+
+
+class AdaptiveLimiter:
+    """Limits in-flight requests to one endpoint and adapts the limit.
+
+    The limit is halved whenever the endpoint answers 429, lowered by one when
+    latency drifts well above its observed floor, and raised by one after a
+    full window of healthy responses (additive increase, multiplicative
+    decrease). Callers beyond the limit wait in a FIFO queue instead of
+    failing.
+
+    Total request time grows with the length of the completion, so it is not
+    used as the congestion signal. Streamed requests report their time to
+    first token; other requests are measured in seconds per output token.
+    Each signal has its own average and floor.
+
+    State is guarded by a threading.Lock, so one limiter enforces its limits
+    across every thread and event loop; a queued caller waits on a future of
+    its own loop, which is resolved through ``call_soon_threadsafe``.
+    """
+
+    # Latency above this multiple of the observed floor counts as congestion
+    LATENCY_TOLERANCE = 3.0
+    # Weight of the newest sample in the latency moving average
+    LATENCY_ALPHA = 0.2
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int = 16,
+        min_concurrency: int = 1,
+        rpm: Optional[int] = None,
+        tpm: Optional[int] = None,
+    ):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.limit = max_concurrency
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        # (loop, future) of each queued caller, oldest first
+        self._waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+        self._successes = 0
+        # "first_token" or "per_token" -> trend of that signal
+        self._latency: Dict[str, LatencyTrend] = {}
+
+        self.stats: Dict[str, float] = {
+            "requests": 0,
+            "rate_limited": 0,
+            "queued": 0,
+            "queue_seconds": 0.0,
+        }
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    async def _acquire_slot(self) -> None:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._in_flight < self.limit and not self._waiters:
+                self._in_flight += 1
+                return
+            self.stats["queued"] += 1
+            waiter = loop.create_future()
+            self._waiters.append((loop, waiter))
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            with self._lock:
+                try:
+                    self._waiters.remove((loop, waiter))
+                    queued = True
+                except ValueError:
+                    queued = False
+            if not queued and waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we were cancelled
+                self._release_slot()
+            # Otherwise _grant finds the waiter cancelled and frees the slot
+            raise
+
+    def _release_slot(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            self._wake()
+
+    def _wake(self) -> None:
+        """Hand free slots to queued callers (call with the lock held)."""
+        while self._waiters and self._in_flight < self.limit:
+            loop, waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self._in_flight += 1
+            try:
+                loop.call_soon_threadsafe(self._grant, waiter)
+            except RuntimeError:
+                # The waiter's loop has closed
+                self._in_flight -= 1
+
+    def _grant(self, waiter: asyncio.Future) -> None:
+        """Resolve a woken waiter on its own loop."""
+        if waiter.done():
+            self._release_slot()
+        else:
+            waiter.set_result(None)
+
+    def on_rate_limited(self) -> None:
+        """Back off after the endpoint answered 429."""
+        with self._lock:
+            self.stats["rate_limited"] += 1
+            self._successes = 0
+            new_limit = max(self.min_concurrency, self.limit // 2)
+            if new_limit != self.limit:
+                logger.warning(
+                    f"Rate limited by {self.name}; concurrency {self.limit} -> {new_limit}"
+                )
+                self.limit = new_limit
+
+    def on_success(
+        self, latency: Optional[float] = None, signal: str = "first_token"
+    ) -> None:
+        """Adjust the limit after a successful request.
+
+        Args:
+            latency: Congestion signal of the request in seconds, or None when
+                it could not be measured
+            signal: "first_token" for time to first token, "per_token" for
+                seconds per output token
+        """
+        with self._lock:
+            if latency is not None:
+                trend = self._latency.get(signal)
+                if trend is None:
+                    trend = self._latency[signal] = LatencyTrend(
+                        self.LATENCY_ALPHA, self.LATENCY_TOLERANCE
+                    )
+                if trend.observe(latency):
+                    self._successes = 0
+                    if self.limit > self.min_concurrency:
+                        self.limit -= 1
+                    return
+
+            self._successes += 1
+            if self._successes >= self.limit and self.limit < self.max_concurrency:
+                self._successes = 0
+                self.limit += 1
+                self._wake()
+
+    @asynccontextmanager
+    async def lease(self, prompt_tokens: int = 0):
+        """Hold one request slot and its RPM/TPM budget for the duration.
+
+        Yields:
+            A RateLimitLease; call ``record_usage`` on it once the completion
+            token count is known so TPM accounting includes the output, and
+            ``mark_first_token`` when a stream delivers its first chunk.
+        """
+        start = time.monotonic()
+        if self.requests:
+            await self.requests.acquire(1)
+        if self.tokens and prompt_tokens:
+            await self.tokens.acquire(prompt_tokens)
+        await self._acquire_slot()
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["queue_seconds"] += time.monotonic() - start
+
+        lease = RateLimitLease(self)
+        try:
+            yield lease
+        except RateLimitError:
+            self.on_rate_limited()
+            raise
+        else:
+            self.on_success(*lease.congestion_signal())
+        finally:
+            self._release_slot()
+
+
+class RateLimitLease:
+    """Handle for reporting usage of a request admitted by an AdaptiveLimiter."""
+
+    def __init__(self, limiter: AdaptiveLimiter):
+        self.limiter = limiter
+        self.sent = time.monotonic()
+        self.first_token_at: Optional[float] = None
+        self.completion_tokens: Optional[int] = None
+
+    def mark_first_token(self) -> None:
+        """Note when a stream delivered its first chunk."""
+        if self.first_token_at is None:
+            self.first_token_at = time.monotonic()
+
+    def record_usage(self, completion_tokens: int) -> None:
+        self.completion_tokens = completion_tokens
+        if self.limiter.tokens and completion_tokens:
+            self.limiter.tokens.consume(completion_tokens)
+
+    def congestion_signal(self) -> Tuple[Optional[float], str]:
+        """(latency, signal) for AdaptiveLimiter.on_success."""
+        if self.first_token_at is not None:
+            return self.first_token_at - self.sent, "first_token"
+        if self.completion_tokens:
+            return (time.monotonic() - self.sent) / self.completion_tokens, "per_token"
+        return None, "per_token"
+
+
+# (base_url, model) -> limiter, shared by every thread and event loop
+_limiters: Dict[Tuple[str, str], AdaptiveLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(
+    base_url: str,
+    model: str,
+    max_concurrency: int = 16,
+    rpm: Optional[int] = None,
+    tpm: Optional[int] = None,
+) -> AdaptiveLimiter:
+    """
+    Get the limiter shared by every LLM profile using the same endpoint and model.
+
+    The first profile to register an endpoint decides its budgets. The
+    limiter is process-wide, so the budgets hold however many threads or
+    event loops send requests.
+
+    Args:
+        base_url: The API base URL
+        model: The model name
+        max_concurrency: Upper bound for in-flight requests
+        rpm: Requests-per-minute budget, or None for no limit
+        tpm: Tokens-per-minute budget, or None for no limit
+
+    Returns:
+        The AdaptiveLimiter for this endpoint and model
+    """
+    key = (base_url, model)
+    with _limiters_lock:
+        if key not in _limiters:
+            _limiters[key] = AdaptiveLimiter(
+                name=f"{model}@{base_url}",
+                max_concurrency=max_concurrency,
+                rpm=rpm,
+                tpm=tpm,
+            )
+        return _limiters[key]
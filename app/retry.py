@@ -0,0 +1,183 @@
+"""Error-classified retry policy for LLM calls."""
+import asyncio
+import functools
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Optional
+
+from openai import (
+    APIConnectionError,
+    APIStatusError,
+    APITimeoutError,
+    InternalServerError,
+    RateLimitError,
+)
+from tenacity import (
+    AsyncRetrying,
+    RetryCallState,
+    retry_if_exception,
+    stop_after_attempt,
+    stop_before_delay,
+    wait_random_exponential,
+)
+
+from app.logger import logger
+from app.metrics import current_call
+
+
+def disable_retry(exc: BaseException) -> BaseException:
+    """Mark exc as final, e.g. when output has already been streamed to a caller."""
+    exc.retry_disabled = True
+    return exc
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Whether an LLM call that raised exc is worth retrying.
+
+    Rate limits, timeouts, connection failures and 5xx responses are
+    transient. Validation errors, authentication and other 4xx responses
+    (including context-length overflows) fail fast, as do errors passed
+    through ``disable_retry``.
+    """
+    if getattr(exc, "retry_disabled", False):
+        return False
+    if isinstance(exc, (RateLimitError, APITimeoutError, APIConnectionError)):
+        return True
+    if isinstance(exc, InternalServerError):
+        return True
+    if isinstance(exc, APIStatusError):
+        return exc.status_code >= 500
+    return False
+
+
+def retry_after_seconds(exc: BaseException) -> Optional[float]:
+    """Read the server-requested delay from a response's Retry-After headers."""
+    response = getattr(exc, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class RetryPolicy:
+    """Retries LLM calls according to the error class that made them fail.
+
+    - Non-retryable errors (see ``is_retryable``) are raised immediately.
+    - 429 responses wait for ``Retry-After`` when the server sends it, and
+      otherwise back off exponentially; either way for at most ``max_wait``
+      seconds.
+    - Transient 5xx, timeout and connection errors use short jittered waits.
+    - ``deadline`` bounds the whole call, including every attempt and wait;
+      a retry whose wait would pass it is not attempted.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 6,
+        max_wait: float = 60,
+        transient_max_wait: float = 8,
+        deadline: Optional[float] = None,
+    ):
+        self.max_attempts = max_attempts
+        self.max_wait = max_wait
+        self.transient_max_wait = transient_max_wait
+        self.deadline = deadline
+
+        self._rate_limit_wait = wait_random_exponential(min=1, max=max_wait)
+        self._transient_wait = wait_random_exponential(
+            multiplier=0.5, max=transient_max_wait
+        )
+
+        self.stats: Dict[str, float] = {
+            "calls": 0,
+            "retries": 0,
+            "fast_failures": 0,
+            "deadline_exceeded": 0,
+            "backoff_seconds": 0.0,
+        }
+
+    def _wait(self, retry_state: RetryCallState) -> float:
+        exc = retry_state.outcome.exception()
+        if isinstance(exc, RateLimitError):
+            retry_after = retry_after_seconds(exc)
+            if retry_after is not None:
+                # A bogus header must not stall the call indefinitely
+                return min(retry_after, self.max_wait)
+            return self._rate_limit_wait(retry_state)
+        return self._transient_wait(retry_state)
+
+    def _before_sleep(self, retry_state: RetryCallState) -> None:
+        wait = retry_state.next_action.sleep if retry_state.next_action else 0
+        self.stats["retries"] += 1
+        self.stats["backoff_seconds"] += wait
+        call = current_call()
+        if call is not None:
+            call.retries += 1
+        logger.warning(
+            f"Retrying {retry_state.fn.__name__} in {wait:.1f}s "
+            f"(attempt {retry_state.attempt_number}/{self.max_attempts}) after: "
+            f"{retry_state.outcome.exception()}"
+        )
+
+    def _retrying(self) -> AsyncRetrying:
+        stop = stop_after_attempt(self.max_attempts)
+        if self.deadline is not None:
+            stop = stop | stop_before_delay(self.deadline)
+        return AsyncRetrying(
+            retry=retry_if_exception(is_retryable),
+            wait=self._wait,
+            stop=stop,
+            before_sleep=self._before_sleep,
+            reraise=True,
+        )
+
+    async def call(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) under this policy."""
+        self.stats["calls"] += 1
+        start = time.monotonic()
+        try:
+            if self.deadline is None:
+                return await self._retrying()(fn, *args, **kwargs)
+            async with asyncio.timeout(self.deadline):
+                return await self._retrying()(fn, *args, **kwargs)
+        except TimeoutError:
+            self.stats["deadline_exceeded"] += 1
+            logger.error(
+                f"{fn.__name__} exceeded its {self.deadline}s deadline "
+                f"after {time.monotonic() - start:.1f}s"
+            )
+            raise
+        except Exception as e:
+            if not is_retryable(e):
+                self.stats["fast_failures"] += 1
+            raise
+
+
+def with_retry_policy(func: Callable) -> Callable:
+    """Decorate an LLM coroutine method to run under ``self.retry_policy``."""
+
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        return await self.retry_policy.call(func, self, *args, **kwargs)
+
+    return wrapper
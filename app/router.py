@@ -0,0 +1,204 @@
+"""Health-aware routing of LLM requests across several endpoints."""
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Deque, Dict, List, Optional, Tuple
+
+from app.logger import logger
+
+
+if TYPE_CHECKING:
+    from app.llm import LLM
+
+
+class EndpointHealth:
+    """Moving window of outcomes and latencies for one endpoint."""
+
+    def __init__(self, window: int, window_seconds: float):
+        # (timestamp, succeeded, latency in seconds)
+        self.samples: Deque[Tuple[float, bool, float]] = deque(maxlen=window)
+        self.window_seconds = window_seconds
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.ejections = 0
+        # When the outstanding probe request was sent, if one is
+        self.probe_started: Optional[float] = None
+
+    def prune(self, now: float) -> None:
+        """Forget samples that fell out of the time window."""
+        while self.samples and now - self.samples[0][0] > self.window_seconds:
+            self.samples.popleft()
+
+    @property
+    def success_rate(self) -> float:
+        if not self.samples:
+            return 1.0
+        return sum(ok for _, ok, _ in self.samples) / len(self.samples)
+
+    @property
+    def latency(self) -> Optional[float]:
+        latencies = [latency for _, ok, latency in self.samples if ok]
+        return sum(latencies) / len(latencies) if latencies else None
+
+    def is_ejected(self, now: float) -> bool:
+        return now < self.ejected_until
+
+    def is_probing(self, now: float, timeout: float) -> bool:
+        """Whether a probe is outstanding and has not yet timed out."""
+        return self.probe_started is not None and now - self.probe_started < timeout
+
+
+class LLMRouter:
+    """Sends each request to the healthiest, lowest-latency endpoint.
+
+    Endpoints are scored by mean latency divided by success rate over a
+    moving window of the last ``window`` requests within ``window_seconds``;
+    endpoints without recent samples are tried first so every one keeps
+    getting measured. An endpoint that fails ``failure_threshold`` times in a row,
+    whose success rate drops below ``min_success_rate``, or that fails with no
+    success left in its window (it would otherwise score worst, never be
+    picked, and never reach the threshold), is ejected for
+    ``eject_seconds`` (doubling on each repeated ejection). Once that expires
+    it receives a single probe request, and is restored if the probe succeeds.
+    A probe that is cancelled, or still unanswered after ``probe_timeout``
+    seconds, makes way for a new one.
+    """
+
+    def __init__(
+        self,
+        endpoints: List["LLM"],
+        names: List[str],
+        window: int = 20,
+        window_seconds: float = 120.0,
+        failure_threshold: int = 3,
+        min_success_rate: float = 0.5,
+        eject_seconds: float = 30.0,
+        max_eject_seconds: float = 600.0,
+        probe_timeout: float = 60.0,
+    ):
+        if not endpoints:
+            raise ValueError("Router needs at least one endpoint")
+        self.endpoints = endpoints
+        self.names = names
+        self.failure_threshold = failure_threshold
+        self.min_success_rate = min_success_rate
+        self.eject_seconds = eject_seconds
+        self.max_eject_seconds = max_eject_seconds
+        self.probe_timeout = probe_timeout
+        self.health: Dict[int, EndpointHealth] = {
+            id(endpoint): EndpointHealth(window, window_seconds)
+            for endpoint in endpoints
+        }
+
+    def _name(self, endpoint: "LLM") -> str:
+        return self.names[self.endpoints.index(endpoint)]
+
+    def _score(self, endpoint: "LLM") -> float:
+        health = self.health[id(endpoint)]
+        if not health.samples:
+            return 0.0
+        if health.latency is None:
+            return float("inf")
+        return health.latency / max(health.success_rate, 0.05)
+
+    def select(self) -> Tuple["LLM", bool]:
+        """
+        Pick the endpoint for the next request.
+
+        Returns:
+            (endpoint, probe): probe is True when the request is the probe of
+            an ejected endpoint; pass it on to ``record`` or ``cancel_probe``
+        """
+        now = time.monotonic()
+        candidates = []
+        for endpoint in self.endpoints:
+            health = self.health[id(endpoint)]
+            health.prune(now)
+            if health.is_ejected(now) or health.is_probing(now, self.probe_timeout):
+                continue
+            if health.ejected_until:
+                # Ejection expired: send exactly one probe before restoring it
+                if health.probe_started is not None:
+                    logger.warning(
+                        f"Probe of LLM endpoint '{self._name(endpoint)}' timed out"
+                    )
+                health.probe_started = now
+                logger.info(f"Probing LLM endpoint '{self._name(endpoint)}'")
+                return endpoint, True
+            candidates.append(endpoint)
+
+        if not candidates:
+            # Everything is ejected; use the endpoint that recovers soonest
+            endpoint = min(
+                self.endpoints, key=lambda e: self.health[id(e)].ejected_until
+            )
+            logger.warning(
+                f"All LLM endpoints are unhealthy, falling back to '{self._name(endpoint)}'"
+            )
+            return endpoint, False
+
+        return min(candidates, key=self._score), False
+
+    def record(
+        self, endpoint: "LLM", succeeded: bool, latency: float, probe: bool = False
+    ) -> None:
+        """Record the outcome of a request sent to endpoint.
+
+        Args:
+            endpoint: The endpoint the request went to
+            succeeded: False if the endpoint failed (a retryable error)
+            latency: Seconds the request took
+            probe: Whether the request was the endpoint's probe
+        """
+        health = self.health[id(endpoint)]
+        health.samples.append((time.monotonic(), succeeded, latency))
+        was_probing = probe and health.probe_started is not None
+        if probe:
+            health.probe_started = None
+
+        if succeeded:
+            health.consecutive_failures = 0
+            if was_probing:
+                health.ejected_until = 0.0
+                health.ejections = 0
+                logger.info(f"LLM endpoint '{self._name(endpoint)}' restored")
+            return
+
+        health.consecutive_failures += 1
+        unhealthy = (
+            was_probing
+            or health.consecutive_failures >= self.failure_threshold
+            or health.latency is None
+            or (
+                len(health.samples) >= 5 and health.success_rate < self.min_success_rate
+            )
+        )
+        if unhealthy:
+            self._eject(endpoint, health)
+
+    def cancel_probe(self, endpoint: "LLM") -> None:
+        """Forget a probe that ended without an outcome, so the next request probes again."""
+        self.health[id(endpoint)].probe_started = None
+
+    def _eject(self, endpoint: "LLM", health: EndpointHealth) -> None:
+        duration = min(
+            self.eject_seconds * (2**health.ejections), self.max_eject_seconds
+        )
+        health.ejections += 1
+        health.consecutive_failures = 0
+        health.samples.clear()
+        health.ejected_until = time.monotonic() + duration
+        logger.warning(
+            f"Ejecting LLM endpoint '{self._name(endpoint)}' for {duration:.0f}s"
+        )
+
+    @property
+    def stats(self) -> Dict[str, Dict[str, Optional[float]]]:
+        now = time.monotonic()
+        return {
+            name: {
+                "success_rate": self.health[id(endpoint)].success_rate,
+                "latency": self.health[id(endpoint)].latency,
+                "ejected": self.health[id(endpoint)].is_ejected(now),
+            }
+            for name, endpoint in zip(self.names, self.endpoints)
+        }
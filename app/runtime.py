@@ -0,0 +1,32 @@
+"""Process shutdown shared by the entry points."""
+import time
+
+from app.cassette import get_cassette
+from app.config import PROJECT_ROOT
+from app.http_pool import close_http_pools
+from app.llm import LLM
+from app.logger import logger
+from app.metrics import metrics
+
+
+async def shutdown(report_name: str = "metrics") -> None:
+    """
+    Close every LLM resource on the running event loop and write the run's reports.
+
+    Args:
+        report_name: Prefix of the metrics report files written to logs/
+    """
+    await LLM.aclose_all()
+    await close_http_pools()
+    cassette = get_cassette()
+    if cassette is not None:
+        cassette.log_summary()
+    json_path, _ = metrics.write_reports(
+        PROJECT_ROOT / "logs", f"{report_name}_{time.strftime('%Y%m%d%H%M%S')}"
+    )
+    for profile, usage in metrics.prompt_cache_report().items():
+        logger.info(
+            f"Prompt cache ({profile}): {usage['cached_tokens']:.0f} of "
+            f"{usage['prompt_tokens']:.0f} prompt tokens cached ({usage['hit_rate']:.1%})"
+        )
+    logger.info(f"LLM metrics written to {json_path}")
@@ -1,27 +1,39 @@
+from collections import deque
 from enum import Enum
-from typing import Any, List, Literal, Optional, Union
+from itertools import islice
+from typing import Any, Deque, Iterable, Iterator, List, Literal, Optional, Tuple, Union
+
+from pydantic import BaseModel, Field, PrivateAttr, field_validator
+
+from app.memory_store import MemoryStore
+from app.token_counter import TokenCounter
 
-from pydantic import BaseModel, Field
 
 class Role(str, Enum):
     """Message role options"""
+
     SYSTEM = "system"
     USER = "user"
-    ASSISTANT = "assistant" 
+    ASSISTANT = "assistant"
     TOOL = "tool"
 
+
 ROLE_VALUES = tuple(role.value for role in Role)
 ROLE_TYPE = Literal[ROLE_VALUES]  # type: ignore
 
+
 class ToolChoice(str, Enum):
     """Tool choice options"""
+
     NONE = "none"
     AUTO = "auto"
     REQUIRED = "required"
 
+
 TOOL_CHOICE_VALUES = tuple(choice.value for choice in ToolChoice)
 TOOL_CHOICE_TYPE = Literal[TOOL_CHOICE_VALUES]  # type: ignore
 
+
 class AgentState(str, Enum):
     """Agent execution states"""
 
@@ -47,12 +59,24 @@ class ToolCall(BaseModel):
 class Message(BaseModel):
     """Represents a chat message in the conversation"""
 
-    role: ROLE_TYPE = Field(...) # type: ignore
+    role: ROLE_TYPE = Field(...)  # type: ignore
     content: Optional[str] = Field(default=None)
     tool_calls: Optional[List[ToolCall]] = Field(default=None)
     name: Optional[str] = Field(default=None)
     tool_call_id: Optional[str] = Field(default=None)
 
+    # Wire-format dict and token counts (tokenizer key -> count), built on
+    # first use and dropped whenever a field is reassigned
+    _wire: Optional[dict] = PrivateAttr(default=None)
+    _tokens: Optional[dict] = PrivateAttr(default=None)
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name in type(self).model_fields:
+            private = self.__pydantic_private__
+            private["_wire"] = None
+            private["_tokens"] = None
+
     def __add__(self, other) -> List["Message"]:
         """支持 Message + list 或 Message + Message 的操作"""
         if isinstance(other, list):
@@ -86,6 +110,39 @@ class Message(BaseModel):
             message["tool_call_id"] = self.tool_call_id
         return message
 
+    def to_wire(self) -> dict:
+        """Validated wire-format dict, computed once and reused.
+
+        The returned dict is shared between calls and must not be mutated;
+        use to_dict() for a private copy.
+
+        Raises:
+            ValueError: If the message has neither content nor tool_calls
+        """
+        # Read the private slot directly: attribute access through pydantic's
+        # __getattr__ costs more than rebuilding a small dict
+        private = self.__pydantic_private__
+        message = private["_wire"]
+        if message is None:
+            message = self.to_dict()
+            if "content" not in message and "tool_calls" not in message:
+                raise ValueError(
+                    "Message must contain either 'content' or 'tool_calls'"
+                )
+            private["_wire"] = message
+        return message
+
+    def token_count(self, counter: TokenCounter) -> int:
+        """Tokens of the wire-format message under counter, computed once per tokenizer."""
+        private = self.__pydantic_private__
+        counts = private["_tokens"]
+        if counts is None:
+            counts = private["_tokens"] = {}
+        tokens = counts.get(counter.key)
+        if tokens is None:
+            tokens = counts[counter.key] = counter.count_message(self.to_wire())
+        return tokens
+
     @classmethod
     def user_message(cls, content: str) -> "Message":
         """Create a user message"""
@@ -104,7 +161,9 @@ class Message(BaseModel):
     @classmethod
     def tool_message(cls, content: str, name, tool_call_id: str) -> "Message":
         """Create a tool message"""
-        return cls(role=Role.TOOL, content=content, name=name, tool_call_id=tool_call_id)
+        return cls(
+            role=Role.TOOL, content=content, name=name, tool_call_id=tool_call_id
+        )
 
     @classmethod
     def from_tool_calls(
@@ -125,28 +184,363 @@ class Message(BaseModel):
         )
 
 
+# Tokenizer-agnostic counter for Memory's token bound
+_token_counter = TokenCounter()
+
+
+class MessageWindow(deque):
+    """The deque behind Memory.messages, which also slices and concatenates like a list."""
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+        return super().__getitem__(index)
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+
+class _GroupIndex:
+    """Messages of a Memory with the size of each eviction group, oldest first."""
+
+    __slots__ = ("messages", "entries", "groups", "size", "tokens", "summary")
+
+    def __init__(self):
+        self.messages: MessageWindow = MessageWindow()
+        # (message, store seq) per message, kept apart from messages so the
+        # seqs survive direct changes to it; seq is None when nothing was stored
+        self.entries: Deque[Tuple[Message, Optional[int]]] = deque()
+        # [message count, token count] per group
+        self.groups: Deque[List[int]] = deque()
+        self.size = 0
+        self.tokens = 0
+        # Whether the first group is the rolling summary, which is never evicted
+        self.summary = False
+
+    def append(self, message: Message, seq: Optional[int] = None) -> None:
+        tokens = message.token_count(_token_counter)
+        self.messages.append(message)
+        self.entries.append((message, seq))
+        if message.role == Role.TOOL and self.groups:
+            group = self.groups[-1]
+            group[0] += 1
+            group[1] += tokens
+        else:
+            self.groups.append([1, tokens])
+        self.size += 1
+        self.tokens += tokens
+
+    def prepend(self, message: Message, seq: Optional[int] = None) -> None:
+        """Insert message as a group of its own before all others."""
+        tokens = message.token_count(_token_counter)
+        self.messages.appendleft(message)
+        self.entries.appendleft((message, seq))
+        self.groups.appendleft([1, tokens])
+        self.size += 1
+        self.tokens += tokens
+
+    def evict_oldest(self) -> None:
+        """Drop the oldest group, or the one after the rolling summary."""
+        if not self.summary:
+            self._pop_group()
+            return
+        head = self.messages.popleft(), self.entries.popleft(), self.groups.popleft()
+        self._pop_group()
+        self.messages.appendleft(head[0])
+        self.entries.appendleft(head[1])
+        self.groups.appendleft(head[2])
+
+    def _pop_group(self) -> None:
+        count, tokens = self.groups.popleft()
+        for _ in range(count):
+            self.messages.popleft()
+            self.entries.popleft()
+        self.size -= count
+        self.tokens -= tokens
+
+
 class Memory(BaseModel):
-    messages: List[Message] = Field(default_factory=list)
+    """Conversation history kept as a sliding window.
+
+    An assistant message with tool_calls and the tool messages answering it
+    form one group, and whole groups are evicted oldest first, so the window
+    never starts with an orphaned tool message. The window holds at most
+    max_messages messages and, when max_tokens is set, at most that many
+    tokens; the newest group is always kept. Eviction is O(1) per message.
+    The rolling summary written by ``compact`` stays at the head and is
+    never evicted; only the next compaction replaces it.
+
+    messages is a MessageWindow, a deque that also supports list slicing.
+    Replacing or mutating it directly is picked up on the next operation;
+    ``replace`` does the same and writes only the difference to the store.
+    """
+
+    messages: Deque[Message] = Field(default_factory=MessageWindow)
     max_messages: int = Field(default=100)
+    max_tokens: Optional[int] = Field(default=None)
+    store: Optional[MemoryStore] = Field(
+        default=None,
+        exclude=True,
+        description="Durable transcript every change is written to",
+    )
+
+    _window: "_GroupIndex" = PrivateAttr(default_factory=lambda: _GroupIndex())
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    @field_validator("messages")
+    @classmethod
+    def _as_window(cls, messages: Deque[Message]) -> MessageWindow:
+        return (
+            messages if isinstance(messages, MessageWindow) else MessageWindow(messages)
+        )
+
+    @classmethod
+    def from_store(cls, store: MemoryStore, **limits) -> "Memory":
+        """
+        Resume a memory from its transcript.
+
+        The records are paged in and replayed in order, so only the window and
+        a few pages are resident however long the transcript is.
+
+        Args:
+            store: The transcript to resume, which new messages are appended to
+            **limits: max_messages and max_tokens of the resumed window
+
+        Returns:
+            Memory: The window as it was when the transcript was last written
+        """
+        memory = cls(**limits)
+        for record in store.read():
+            memory._replay(record)
+        memory.store = store
+        return memory
+
+    def attach(self, store: MemoryStore) -> None:
+        """Write changes to store from now on, starting with the messages already here."""
+        self.store = store
+        index = self._index()
+        for position, (message, _) in enumerate(index.entries):
+            index.entries[position] = (message, store.append("add", message.to_dict()))
+
+    def _replay(self, record: dict) -> None:
+        op = record["op"]
+        if op == "clear":
+            self.clear()
+            return
+        index = self._index()
+        if op == "drop":
+            dropped = set(record["seqs"])
+            self._sync(index, [m for m, seq in index.entries if seq not in dropped])
+            return
+        message = Message(**record["message"])
+        if op == "add":
+            index.append(message, record["seq"])
+            self._evict(index)
+        elif op == "compact":
+            through = record.get("through")
+            count = 0
+            for position, (_, seq) in enumerate(index.entries):
+                # The previous summary was written after what it covers, but
+                # is always folded into the next one
+                summary = position == 0 and index.summary
+                if (
+                    not summary
+                    and through is not None
+                    and seq is not None
+                    and seq > through
+                ):
+                    break
+                count += 1
+            self._fold(index, count, message, record["seq"])
+
+    def _index(self) -> "_GroupIndex":
+        """The group index of messages, rebuilt if messages was replaced or mutated directly."""
+        # Read the private slot directly, as in Message.to_wire
+        index = self.__pydantic_private__["_window"]
+        messages = self.messages
+        if index.messages is not messages or index.size != len(messages):
+            index = self._sync(index, list(messages))
+        return index
+
+    def _sync(self, index: "_GroupIndex", messages: List[Message]) -> "_GroupIndex":
+        """Rebuild the index around messages, writing only the difference to the store.
+
+        Messages still in index keep their seqs. When they stay in order
+        ahead of the new ones, the store gets a "drop" record for the removed
+        messages and an "add" record per new one; any other change is stored
+        as a "clear" followed by every message. The limits are applied to the
+        result.
+        """
+        seqs = {id(message): seq for message, seq in index.entries}
+        # Leading run of messages that were already in index, each once
+        kept = 0
+        seen = set()
+        for message in messages:
+            if id(message) not in seqs or id(message) in seen:
+                break
+            seen.add(id(message))
+            kept += 1
+        added = messages[kept:]
+        in_order = all(id(m) not in seqs for m in added) and [
+            id(m) for m, _ in index.entries if id(m) in seen
+        ] == [id(m) for m in messages[:kept]]
+
+        store = self.store
+        rebuilt = self.__pydantic_private__["_window"] = _GroupIndex()
+        self.messages = rebuilt.messages
+        if in_order:
+            # The summary stays exempt from eviction while it is still first
+            rebuilt.summary = (
+                index.summary and kept > 0 and messages[0] is index.entries[0][0]
+            )
+            dropped = [
+                seq for m, seq in index.entries if id(m) not in seen and seq is not None
+            ]
+            if store is not None and dropped:
+                store.append("drop", seqs=dropped)
+            for message in messages[:kept]:
+                rebuilt.append(message, seqs[id(message)])
+        else:
+            if store is not None:
+                store.append("clear")
+            added = messages
+        for message in added:
+            rebuilt.append(
+                message,
+                store.append("add", message.to_dict()) if store is not None else None,
+            )
+        self._evict(rebuilt)
+        return rebuilt
+
+    def _evict(self, index: "_GroupIndex") -> None:
+        max_tokens = self.max_tokens
+        while len(index.groups) > 1 + index.summary and (
+            index.size > self.max_messages
+            or (max_tokens is not None and index.tokens > max_tokens)
+        ):
+            index.evict_oldest()
+
+    @property
+    def token_count(self) -> int:
+        """Estimated tokens of the messages in the window."""
+        return self._index().tokens
 
     def add_message(self, message: Message) -> None:
-        """Add a message to memory"""
-        self.messages.append(message)
-        # Optional: Implement message limit
-        if len(self.messages) > self.max_messages:
-            self.messages = self.messages[-self.max_messages :]
+        """Add a message to memory, evicting the oldest groups beyond the limits"""
+        index = self._index()
+        seq = (
+            self.store.append("add", message.to_dict())
+            if self.store is not None
+            else None
+        )
+        index.append(message, seq)
+        self._evict(index)
 
     def add_messages(self, messages: List[Message]) -> None:
         """Add multiple messages to memory"""
-        self.messages.extend(messages)
+        index = self._index()
+        for message in messages:
+            seq = (
+                self.store.append("add", message.to_dict())
+                if self.store is not None
+                else None
+            )
+            index.append(message, seq)
+        self._evict(index)
+
+    def replace(self, messages: Iterable[Message]) -> None:
+        """Make messages the contents of memory, within its limits.
+
+        Messages already in memory keep their place in the store, so
+        replacing the window with a trimmed or extended copy of itself only
+        records what changed.
+        """
+        self._sync(self._index(), list(messages))
 
     def clear(self) -> None:
         """Clear all messages"""
-        self.messages.clear()
+        if self.store is not None:
+            self.store.append("clear")
+        index = self.__pydantic_private__["_window"] = _GroupIndex()
+        self.messages = index.messages
+
+    def history(self) -> Iterator[Message]:
+        """Every message added, and every summary, in order, paged in from the store.
+
+        Without a store only the current window is available.
+        """
+        if self.store is None:
+            yield from list(self.messages)
+            return
+        for record in self.store.read():
+            if "message" in record:
+                yield Message(**record["message"])
+
+    def foldable_prefix(self, keep_recent: int) -> int:
+        """How many of the oldest messages may be folded into a summary.
+
+        The prefix ends on a group boundary, leaves at least keep_recent of the
+        latest messages, and stops before the first tool call still waiting
+        for its results.
+        """
+        index = self._index()
+        messages = list(index.messages)
+        limit = index.size - keep_recent
+        folded = 0
+        for count, _ in index.groups:
+            if folded + count > limit:
+                break
+            head = messages[folded]
+            if head.tool_calls and count - 1 < len(head.tool_calls):
+                break
+            folded += count
+        return folded
+
+    def compact(self, last_folded: Message, summary: Message) -> bool:
+        """Replace the messages up to and including last_folded with summary.
+
+        Returns False, leaving memory unchanged, if last_folded is no longer
+        in memory.
+        """
+        index = self._index()
+        position = next(
+            (i for i, m in enumerate(index.messages) if m is last_folded), None
+        )
+        if position is None:
+            return False
+        seq = None
+        if self.store is not None:
+            through = index.entries[position][1]
+            seq = self.store.append("compact", summary.to_dict(), through=through)
+        self._fold(index, position + 1, summary, seq)
+        return True
+
+    def _fold(
+        self, index: "_GroupIndex", count: int, summary: Message, seq: Optional[int]
+    ) -> None:
+        """Replace the oldest count messages, including any earlier summary, with summary."""
+        index.summary = False
+        while index.groups and index.groups[0][0] <= count:
+            count -= index.groups[0][0]
+            index.evict_oldest()
+        if count:
+            # Not on a group boundary: regroup the rest
+            rest = list(index.entries)[count:]
+            index = self.__pydantic_private__["_window"] = _GroupIndex()
+            self.messages = index.messages
+            for message, message_seq in rest:
+                index.append(message, message_seq)
+        index.prepend(summary, seq)
+        index.summary = True
 
     def get_recent_messages(self, n: int) -> List[Message]:
         """Get n most recent messages"""
-        return self.messages[-n:]
+        return list(islice(self.messages, max(len(self.messages) - n, 0), None))
 
     def to_dict_list(self) -> List[dict]:
         """Convert messages to list of dicts"""
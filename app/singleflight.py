@@ -0,0 +1,56 @@
+"""Coalescing of identical in-flight LLM requests."""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time and shares its result.
+
+    The first caller for a key starts the call; callers arriving with the
+    same key while it is still running wait for that call instead of making
+    their own. The shared call is only cancelled once every waiter has gone.
+    """
+
+    def __init__(self):
+        # key -> [task, number of waiters]
+        self._calls: Dict[str, List[Any]] = {}
+        self.stats: Dict[str, int] = {"calls": 0, "coalesced": 0}
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._calls
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Await fn(), or the identical call already in flight for key."""
+        entry = self._calls.get(key)
+        if entry is None:
+            task = asyncio.ensure_future(fn())
+            entry = [task, 0]
+            self._calls[key] = entry
+            task.add_done_callback(lambda _: self._forget(key, entry))
+            self.stats["calls"] += 1
+        else:
+            self.stats["coalesced"] += 1
+
+        entry[1] += 1
+        try:
+            return await asyncio.shield(entry[0])
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and not entry[0].done():
+                # The last waiter gave up (was cancelled): stop the shared call
+                entry[0].cancel()
+                self._forget(key, entry)
+
+    def _forget(self, key: str, entry: List[Any]) -> None:
+        if self._calls.get(key) is entry:
+            del self._calls[key]
+
+    @property
+    def coalesce_rate(self) -> float:
+        """Fraction of requests served by another caller's in-flight call."""
+        total = self.stats["calls"] + self.stats["coalesced"]
+        return self.stats["coalesced"] / total if total else 0.0
@@ -0,0 +1,136 @@
+"""Sinks that receive streamed LLM output as it arrives."""
+import asyncio
+import inspect
+import sys
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Callable, List, Optional, TextIO
+
+
+class StreamSink(ABC):
+    """Destination for the text chunks of a streaming completion."""
+
+    @abstractmethod
+    async def send(self, text: str) -> None:
+        """Deliver one chunk of streamed text."""
+
+    async def close(self) -> None:
+        """Signal that the stream has ended."""
+
+    async def fail(self, error: BaseException) -> None:
+        """Signal that the call producing the stream failed; by default the stream just ends."""
+        await self.close()
+
+
+class StdoutSink(StreamSink):
+    """Writes chunks to a terminal stream without blocking the event loop.
+
+    Chunks are queued and written by a background task in a worker thread,
+    so a slow terminal delays the output but never the agent.
+    """
+
+    def __init__(self, stream: Optional[TextIO] = None):
+        self.stream = stream or sys.stdout
+        self._pending: List[str] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._writer: Optional[asyncio.Task] = None
+        self._closed = False
+
+    def _write(self, text: str) -> None:
+        self.stream.write(text)
+        self.stream.flush()
+
+    async def _drain(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if self._pending:
+                text, self._pending = "".join(self._pending), []
+                await asyncio.to_thread(self._write, text)
+            if self._closed and not self._pending:
+                return
+
+    async def send(self, text: str) -> None:
+        if self._writer is None:
+            self._wakeup = asyncio.Event()
+            self._writer = asyncio.create_task(self._drain())
+        self._pending.append(text)
+        self._wakeup.set()
+
+    async def close(self) -> None:
+        self._closed = True
+        if self._writer is None:
+            self._write("\n")
+            return
+        self._pending.append("\n")
+        self._wakeup.set()
+        await self._writer
+
+
+class CallbackSink(StreamSink):
+    """Passes each chunk to a sync or async callback."""
+
+    def __init__(
+        self,
+        on_text: Callable[[str], Any],
+        on_close: Optional[Callable[[], Any]] = None,
+    ):
+        self.on_text = on_text
+        self.on_close = on_close
+
+    async def send(self, text: str) -> None:
+        result = self.on_text(text)
+        if inspect.isawaitable(result):
+            await result
+
+    async def close(self) -> None:
+        if self.on_close is not None:
+            result = self.on_close()
+            if inspect.isawaitable(result):
+                await result
+
+
+class QueueSink(StreamSink):
+    """A bounded queue of chunks that consumers read as an async iterator.
+
+    ``send`` waits while the queue is full, so a slow consumer applies
+    backpressure to the stream instead of letting chunks pile up.
+
+    If the call fails, iteration raises its error after the chunks already
+    queued; if it is cancelled, iteration just ends.
+
+    Examples:
+        >>> sink = QueueSink(maxsize=64)
+        >>> task = asyncio.create_task(llm.ask(messages, sink=sink))
+        >>> async for text in sink:
+        ...     await websocket.send_text(text)
+    """
+
+    _END = object()
+
+    class _Failure:
+        def __init__(self, error: Exception):
+            self.error = error
+
+    def __init__(self, maxsize: int = 100):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+
+    async def send(self, text: str) -> None:
+        await self.queue.put(text)
+
+    async def close(self) -> None:
+        await self.queue.put(self._END)
+
+    async def fail(self, error: BaseException) -> None:
+        if isinstance(error, Exception):
+            await self.queue.put(self._Failure(error))
+        else:
+            await self.close()
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        while True:
+            item = await self.queue.get()
+            if item is self._END:
+                return
+            if isinstance(item, self._Failure):
+                raise item.error
+            yield item
@@ -0,0 +1,180 @@
+"""JSON-schema structured output: request formats and local validation."""
+import json
+from typing import Any, Dict, List
+
+from app.exceptions import StructuredOutputError
+
+
+_JSON_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "integer": int,
+    "number": (int, float),
+    "boolean": bool,
+    "null": type(None),
+}
+
+
+def schema_errors(value: Any, schema: Dict[str, Any], path: str = "$") -> List[str]:
+    """
+    Check value against the subset of JSON schema used for structured output.
+
+    Supports type, enum, properties, required, additionalProperties, items,
+    minItems/maxItems and minLength. The length keywords are checked here
+    only; ``strict_schema`` removes them from the schema sent to the endpoint.
+
+    Args:
+        value: The decoded JSON value
+        schema: The JSON schema to check against
+        path: Location of value, used in error messages
+
+    Returns:
+        List[str]: One message per violation; empty when value is valid
+    """
+    expected = schema.get("type")
+    if expected is not None:
+        types = expected if isinstance(expected, list) else [expected]
+        # bool is an int subclass, but not a JSON integer or number
+        matches = any(
+            isinstance(value, _JSON_TYPES[t])
+            and not (isinstance(value, bool) and t in ("integer", "number"))
+            for t in types
+            if t in _JSON_TYPES
+        )
+        if not matches:
+            return [
+                f"{path}: expected {' or '.join(types)}, got {type(value).__name__}"
+            ]
+
+    errors = []
+    if "enum" in schema and value not in schema["enum"]:
+        errors.append(f"{path}: {value!r} is not one of {schema['enum']}")
+
+    if isinstance(value, dict):
+        properties = schema.get("properties", {})
+        for name in schema.get("required", []):
+            if name not in value:
+                errors.append(f"{path}: missing required property '{name}'")
+        for name, item in value.items():
+            if name in properties:
+                errors.extend(schema_errors(item, properties[name], f"{path}.{name}"))
+            elif schema.get("additionalProperties") is False:
+                errors.append(f"{path}: unexpected property '{name}'")
+
+    if isinstance(value, list):
+        if "minItems" in schema and len(value) < schema["minItems"]:
+            errors.append(f"{path}: expected at least {schema['minItems']} items")
+        if "maxItems" in schema and len(value) > schema["maxItems"]:
+            errors.append(f"{path}: expected at most {schema['maxItems']} items")
+        if "items" in schema:
+            for i, item in enumerate(value):
+                errors.extend(schema_errors(item, schema["items"], f"{path}[{i}]"))
+
+    if (
+        isinstance(value, str)
+        and "minLength" in schema
+        and len(value) < schema["minLength"]
+    ):
+        errors.append(f"{path}: expected at least {schema['minLength']} characters")
+
+    return errors
+
+
+# Validation keywords that strict mode rejects; parse_structured still checks them
+_STRICT_UNSUPPORTED = frozenset(
+    {
+        "minLength",
+        "maxLength",
+        "pattern",
+        "format",
+        "minItems",
+        "maxItems",
+        "minimum",
+        "maximum",
+        "exclusiveMinimum",
+        "exclusiveMaximum",
+        "multipleOf",
+        "minProperties",
+        "maxProperties",
+        "uniqueItems",
+    }
+)
+
+
+def strict_schema(schema: Any) -> Any:
+    """Copy of schema without the keywords strict ``json_schema`` mode rejects."""
+    if isinstance(schema, list):
+        return [strict_schema(item) for item in schema]
+    if not isinstance(schema, dict):
+        return schema
+    result = {}
+    for key, value in schema.items():
+        if key in ("properties", "$defs", "definitions") and isinstance(value, dict):
+            # Keys of these maps are names, not keywords
+            result[key] = {name: strict_schema(item) for name, item in value.items()}
+        elif key not in _STRICT_UNSUPPORTED:
+            result[key] = strict_schema(value)
+    return result
+
+
+def response_format(mode: str, name: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+    """The response_format request parameter for a structured output mode."""
+    if mode == "json_schema":
+        return {
+            "type": "json_schema",
+            "json_schema": {
+                "name": name,
+                "schema": strict_schema(schema),
+                "strict": True,
+            },
+        }
+    return {"type": "json_object"}
+
+
+def rejects_response_format(error: Exception) -> bool:
+    """
+    Whether a 400 error says the endpoint does not support the response_format.
+
+    Other bad requests, such as a prompt over the context length, say nothing
+    about structured output and must not switch the profile to JSON mode.
+    """
+    if getattr(error, "param", None) == "response_format":
+        return True
+    message = str(error).lower()
+    return "response_format" in message or "json_schema" in message
+
+
+def schema_instruction(schema: Dict[str, Any]) -> str:
+    """System prompt describing the schema, for endpoints that only offer JSON mode."""
+    return (
+        "Reply with a single JSON object, and nothing else, that matches this "
+        f"JSON schema:\n{json.dumps(schema, separators=(',', ':'))}"
+    )
+
+
+def parse_structured(text: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Decode a structured response and validate it against schema.
+
+    Tolerates a Markdown code fence around the JSON, which some models add
+    even in JSON mode.
+
+    Raises:
+        StructuredOutputError: If text is not JSON or does not match schema
+    """
+    text = (text or "").strip()
+    if text.startswith("```"):
+        text = text.strip("`").strip()
+        if text.startswith("json"):
+            text = text[len("json") :]
+    try:
+        value = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise StructuredOutputError(f"Response is not valid JSON: {e}") from e
+    errors = schema_errors(value, schema)
+    if errors:
+        raise StructuredOutputError(
+            "Response does not match the schema: " + "; ".join(errors[:5]), errors
+        )
+    return value
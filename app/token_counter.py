@@ -0,0 +1,209 @@
+"""Local token accounting for LLM requests."""
+import json
+from typing import Callable, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from app.logger import logger
+
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken is optional, fall back to the estimator
+    tiktoken = None
+
+
+# Fixed per-message framing overhead used by chat-completions tokenizers
+MESSAGE_OVERHEAD_TOKENS = 4
+TRUNCATION_MARKER = "\n...[truncated to fit the context window]...\n"
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate used when no real tokenizer is available.
+
+    ASCII text averages about four characters per token, while CJK and other
+    non-ASCII characters are usually one token each.
+    """
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+
+class TokenReport(BaseModel):
+    """Token usage of one request, broken down by section."""
+
+    system: int = 0
+    tools: int = 0
+    history: int = 0
+    limit: Optional[int] = None
+    dropped_messages: int = 0
+    truncated_messages: int = 0
+
+    @property
+    def total(self) -> int:
+        return self.system + self.tools + self.history
+
+    def __str__(self):
+        limit = f"/{self.limit}" if self.limit else ""
+        return (
+            f"{self.total}{limit} tokens (system={self.system}, tools={self.tools}, "
+            f"history={self.history}, dropped={self.dropped_messages}, "
+            f"truncated={self.truncated_messages})"
+        )
+
+
+class TokenCounter:
+    """Counts tokens for messages and tool schemas and trims requests to fit.
+
+    A custom ``tokenizer`` callable (text -> token count) can be plugged in.
+    Otherwise tiktoken is used when it is installed, falling back to
+    ``estimate_tokens``. ``key`` names the tokenizer, so counts cached under
+    it (see ``Message.token_count``) are shared by counters that agree.
+    """
+
+    def __init__(
+        self,
+        model: str = "",
+        tokenizer: Optional[Callable[[str], int]] = None,
+    ):
+        self.model = model
+        if tokenizer is not None:
+            self.key, self.tokenizer = f"custom-{id(tokenizer)}", tokenizer
+        else:
+            self.key, self.tokenizer = self._default_tokenizer(model)
+
+    @staticmethod
+    def _default_tokenizer(model: str) -> Tuple[str, Callable[[str], int]]:
+        if tiktoken is None:
+            return "estimate", estimate_tokens
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding("cl100k_base")
+        return (
+            f"tiktoken-{encoding.name}",
+            lambda text: len(encoding.encode(text, disallowed_special=())),
+        )
+
+    def count_text(self, text: Optional[str]) -> int:
+        return self.tokenizer(text) if text else 0
+
+    def count_message(self, message: dict) -> int:
+        tokens = MESSAGE_OVERHEAD_TOKENS + self.count_text(message.get("content"))
+        if message.get("tool_calls"):
+            tokens += self.count_text(
+                json.dumps(message["tool_calls"], ensure_ascii=False)
+            )
+        if message.get("name"):
+            tokens += self.count_text(message["name"])
+        return tokens
+
+    def count_messages(self, messages: List[dict]) -> int:
+        return sum(self.count_message(msg) for msg in messages)
+
+    def count_tools(self, tools: Optional[List[dict]]) -> int:
+        if not tools:
+            return 0
+        return self.count_text(json.dumps(tools, ensure_ascii=False))
+
+    @staticmethod
+    def _group_history(history: List[dict]) -> List[List[dict]]:
+        """Split history into units that must be kept or dropped together.
+
+        An assistant message with tool_calls and the tool messages answering it
+        form one unit, so trimming never leaves an orphaned tool message.
+        """
+        groups: List[List[dict]] = []
+        for message in history:
+            if message["role"] == "tool" and groups:
+                groups[-1].append(message)
+            else:
+                groups.append([message])
+        return groups
+
+    def fit(
+        self,
+        messages: List[dict],
+        tools: Optional[List[dict]] = None,
+        limit: Optional[int] = None,
+        counts: Optional[List[int]] = None,
+    ) -> Tuple[List[dict], TokenReport]:
+        """Trim formatted messages so the request fits within limit tokens.
+
+        Leading system messages, the first user message (the task) and the
+        latest turn are always kept. Older turns are dropped oldest first, and
+        if that is not enough the longest remaining contents are truncated.
+
+        Args:
+            messages: Formatted messages, system messages first
+            tools: Tool schemas sent with the request
+            limit: Token budget for the prompt, or None to only count
+            counts: Token count of each message, when already known;
+                otherwise every message is counted here
+
+        Returns:
+            The (possibly trimmed) messages and a per-section TokenReport
+        """
+        if counts is None:
+            counts = [self.count_message(message) for message in messages]
+        split = 0
+        while split < len(messages) and messages[split]["role"] == "system":
+            split += 1
+        system, history = messages[:split], messages[split:]
+
+        report = TokenReport(
+            system=sum(counts[:split]),
+            tools=self.count_tools(tools),
+            history=sum(counts[split:]),
+            limit=limit,
+        )
+        if limit is None or report.total <= limit:
+            return messages, report
+
+        groups = self._group_history(history)
+        group_tokens = []
+        position = split
+        for group in groups:
+            group_tokens.append(sum(counts[position : position + len(group)]))
+            position += len(group)
+        pinned = []
+        if groups and groups[0][0]["role"] == "user":
+            pinned = groups.pop(0)
+            group_tokens.pop(0)
+        while len(groups) > 1 and report.total > limit:
+            report.history -= group_tokens.pop(0)
+            report.dropped_messages += len(groups.pop(0))
+
+        history = pinned + [msg for group in groups for msg in group]
+        if report.total > limit:
+            history = self._truncate(history, report, limit)
+
+        logger.warning(f"Trimmed request to fit the context window: {report}")
+        return system + history, report
+
+    def _truncate(
+        self, history: List[dict], report: TokenReport, limit: int
+    ) -> List[dict]:
+        """Truncate the longest message contents until the request fits."""
+        history = list(history)
+        order = sorted(
+            range(len(history)),
+            key=lambda i: len(history[i].get("content") or ""),
+            reverse=True,
+        )
+        for i in order:
+            excess = report.total - limit
+            if excess <= 0:
+                break
+            content = history[i].get("content")
+            if not content:
+                continue
+            tokens = self.count_text(content)
+            keep_tokens = max(tokens - excess - self.count_text(TRUNCATION_MARKER), 0)
+            keep_chars = int(len(content) * keep_tokens / tokens)
+            head = content[: keep_chars // 2]
+            tail = content[len(content) - keep_chars // 2 :] if keep_chars // 2 else ""
+            truncated = head + TRUNCATION_MARKER + tail
+            history[i] = {**history[i], "content": truncated}
+            report.history += self.count_text(truncated) - tokens
+            report.truncated_messages += 1
+        return history
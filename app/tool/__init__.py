@@ -2,8 +2,9 @@ from app.tool.base import BaseTool
 from app.tool.bash import Bash
 from app.tool.create_chat_completion import CreateChatCompletion
 from app.tool.planning import PlanningTool
-from app.tool.str_replace_editor import StrReplaceEditor
+from app.tool.read_blob import ReadBlob
 from app.tool.story_creator import StoryCreator
+from app.tool.str_replace_editor import StrReplaceEditor
 from app.tool.terminate import Terminate
 from app.tool.tool_collection import ToolCollection
 
@@ -16,5 +17,6 @@ __all__ = [
     "ToolCollection",
     "CreateChatCompletion",
     "PlanningTool",
+    "ReadBlob",
     "StoryCreator",
 ]
@@ -10,6 +10,18 @@ A planning tool that allows the agent to create and manage plans for solving com
 The tool provides functionality for creating plans, updating plan steps, and tracking progress.
 """
 
+# Just the shape of a new plan, for creating one through structured output
+# instead of a call to the full planning tool
+PLAN_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "title": {"type": "string", "minLength": 1},
+        "steps": {"type": "array", "items": {"type": "string"}, "minItems": 1},
+    },
+    "required": ["title", "steps"],
+    "additionalProperties": False,
+}
+
 
 class PlanningTool(BaseTool):
     """
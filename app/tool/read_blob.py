@@ -0,0 +1,89 @@
+from typing import Optional
+
+from app.blob_store import get_blob_store
+from app.tool.base import BaseTool
+
+
+_READ_BLOB_DESCRIPTION = """Read part of a large tool output that was stored as a blob.
+Outputs too long to keep in the conversation are replaced by a preview that names a blob handle.
+Use this tool with that handle to read a range of lines (1-based, inclusive) or of bytes (0-based, end exclusive).
+Without a range it returns the size of the blob. Long reads are cut off; read further ranges as needed.
+"""
+
+
+class ReadBlob(BaseTool):
+    name: str = "read_blob"
+    short_description: str = (
+        "Read a line or byte range of a large tool output stored as a blob."
+    )
+    description: str = _READ_BLOB_DESCRIPTION
+    parameters: dict = {
+        "type": "object",
+        "properties": {
+            "handle": {
+                "type": "string",
+                "description": "(required) The blob handle from the preview of the output.",
+            },
+            "start_line": {
+                "type": "integer",
+                "description": "(optional) First line to read, starting at 1.",
+            },
+            "end_line": {
+                "type": "integer",
+                "description": "(optional) Last line to read, inclusive.",
+            },
+            "start_byte": {
+                "type": "integer",
+                "description": "(optional) First byte to read, starting at 0. Ignored when a line range is given.",
+            },
+            "end_byte": {
+                "type": "integer",
+                "description": "(optional) Byte to stop reading at, exclusive.",
+            },
+        },
+        "required": ["handle"],
+    }
+
+    async def execute(
+        self,
+        handle: str,
+        start_line: Optional[int] = None,
+        end_line: Optional[int] = None,
+        start_byte: Optional[int] = None,
+        end_byte: Optional[int] = None,
+    ) -> str:
+        """
+        Read a range of a stored blob.
+
+        Args:
+            handle (str): The blob handle.
+            start_line (int, optional): First line, 1-based.
+            end_line (int, optional): Last line, inclusive.
+            start_byte (int, optional): First byte, 0-based.
+            end_byte (int, optional): End byte, exclusive.
+
+        Returns:
+            str: The requested text, or the blob's size when no range is given.
+        """
+        store = get_blob_store()
+        if store is None:
+            return "Error: The blob store is disabled"
+        try:
+            if not store.exists(handle):
+                return f"Error: No blob with handle '{handle}'"
+            if start_line is not None or end_line is not None:
+                text = store.read_lines(handle, start_line or 1, end_line)
+            elif start_byte is not None or end_byte is not None:
+                text = store.read_bytes(handle, start_byte or 0, end_byte)
+            else:
+                size, lines = store.stat(handle)
+                return f"Blob {handle}: {size} bytes, {lines} lines. Give a line or byte range to read it."
+        except (ValueError, OSError) as e:
+            return f"Error reading blob: {str(e)}"
+
+        if len(text) > store.max_read_chars:
+            text = (
+                text[: store.max_read_chars]
+                + f"\n...[cut off at {store.max_read_chars} characters; read a smaller range]"
+            )
+        return text or "(empty range)"
@@ -1,5 +1,5 @@
 """Collection classes for managing multiple tools."""
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 from app.exceptions import ToolError
 from app.tool.base import BaseTool, ToolFailure, ToolResult
@@ -11,12 +11,22 @@ class ToolCollection:
     def __init__(self, *tools: BaseTool):
         self.tools = tools
         self.tool_map = {tool.name: tool for tool in tools}
+        self._params: Optional[List[Dict[str, Any]]] = None
 
     def __iter__(self):
         return iter(self.tools)
 
     def to_params(self) -> List[Dict[str, Any]]:
-        return [tool.to_param() for tool in self.tools]
+        """Tool schemas sorted by name, so every request lists them identically.
+
+        A byte-stable tool section keeps provider-side prompt prefix caches valid
+        from one step to the next.
+        """
+        if self._params is None:
+            self._params = [
+                tool.to_param() for tool in sorted(self.tools, key=lambda t: t.name)
+            ]
+        return self._params
 
     async def execute(
         self, *, name: str, tool_input: Dict[str, Any] = None
@@ -47,6 +57,7 @@ class ToolCollection:
     def add_tool(self, tool: BaseTool):
         self.tools += (tool,)
         self.tool_map[tool.name] = tool
+        self._params = None
         return self
 
     def add_tools(self, *tools: BaseTool):
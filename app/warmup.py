@@ -0,0 +1,187 @@
+"""Model warm-up and keep-alive for LLM endpoints, local Ollama servers in particular."""
+import asyncio
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple, Union
+
+from pydantic import BaseModel
+
+from app.http_pool import get_http_client, running_loop
+from app.logger import logger
+
+
+if TYPE_CHECKING:
+    from app.llm import LLM
+
+
+class WarmupReport(BaseModel):
+    """Latencies measured while warming up one endpoint and model."""
+
+    profile: str
+    model: str
+    ollama: bool = False
+    cold_seconds: Optional[float] = None
+    warm_seconds: Optional[float] = None
+    load_seconds: Optional[float] = None
+    error: Optional[str] = None
+
+    def describe(self) -> str:
+        if self.error:
+            return f"Warm-up of '{self.profile}' ({self.model}) failed: {self.error}"
+        load = (
+            f" (model load {self.load_seconds:.2f}s)"
+            if self.load_seconds is not None
+            else ""
+        )
+        return (
+            f"Warm-up of '{self.profile}' ({self.model}): cold {self.cold_seconds:.2f}s{load}, "
+            f"warm {self.warm_seconds:.2f}s"
+        )
+
+
+class ModelWarmer:
+    """Preloads a model in the background and keeps it resident.
+
+    The first request measures the cold latency: on an Ollama server it is a
+    native preload that loads the model with the configured ``keep_alive``;
+    elsewhere it is a one-token completion that also opens the pooled
+    connection. A second one-token completion measures the warm
+    latency. Ollama resets a model's expiry to the server default on every
+    OpenAI-style request, so the preload is repeated every
+    ``keep_alive_interval`` seconds to keep the model loaded between long
+    tool executions.
+
+    The preload sends no ``num_ctx``: the OpenAI-compatible requests agents
+    make cannot pass one, and Ollama reloads a model whose context size
+    differs from the loaded one. Set the context size on the server
+    (``OLLAMA_CONTEXT_LENGTH``) or in the Modelfile (``PARAMETER num_ctx``)
+    so the preload and agent requests share the same loaded model.
+    """
+
+    def __init__(
+        self,
+        llm: "LLM",
+        keep_alive: Optional[Union[int, str]] = None,
+        keep_alive_interval: float = 240,
+    ):
+        self.llm = llm
+        self.keep_alive = keep_alive
+        self.keep_alive_interval = keep_alive_interval
+        self.report: Optional[WarmupReport] = None
+        self.task: Optional[asyncio.Task] = None
+        base_url = llm.base_url.rstrip("/")
+        self._ollama_root = (
+            base_url[: -len("/v1")] if base_url.endswith("/v1") else base_url
+        )
+
+    def start(self) -> Optional[asyncio.Task]:
+        """Start warming up in the background; a no-op once started or outside a loop."""
+        if self.task is not None or running_loop() is None:
+            return self.task
+        self.task = asyncio.create_task(self._run())
+        return self.task
+
+    async def aclose(self) -> None:
+        """Stop the keep-alive loop."""
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+
+    async def _run(self) -> None:
+        self.report = await self.warm_up()
+        if self.report.error:
+            logger.warning(self.report.describe())
+            return
+        logger.info(self.report.describe())
+        if not self.report.ollama or not self.keep_alive_interval:
+            return
+        while True:
+            await asyncio.sleep(self.keep_alive_interval)
+            try:
+                await self._preload()
+            except Exception as e:
+                logger.warning(f"Keep-alive for {self.llm.model} failed: {e}")
+
+    async def warm_up(self) -> WarmupReport:
+        """Load the model and measure cold and warm request latency."""
+        report = WarmupReport(profile=self.llm.config_name, model=self.llm.model)
+        try:
+            report.ollama = await self._is_ollama()
+            start = time.monotonic()
+            if report.ollama:
+                report.load_seconds = await self._preload()
+            else:
+                await self._ping()
+            report.cold_seconds = time.monotonic() - start
+
+            start = time.monotonic()
+            await self._ping()
+            report.warm_seconds = time.monotonic() - start
+        except Exception as e:
+            report.error = str(e) or type(e).__name__
+        return report
+
+    async def _is_ollama(self) -> bool:
+        try:
+            response = await get_http_client(self.llm.base_url).get(
+                f"{self._ollama_root}/api/version", timeout=2
+            )
+            return response.status_code == 200 and "version" in response.json()
+        except Exception:
+            return False
+
+    async def _preload(self) -> Optional[float]:
+        """Load the model with Ollama's native API; returns its load time in seconds."""
+        body: Dict[str, Any] = {"model": self.llm.model}
+        if self.keep_alive is not None:
+            body["keep_alive"] = self.keep_alive
+        response = await get_http_client(self.llm.base_url).post(
+            f"{self._ollama_root}/api/generate", json=body
+        )
+        response.raise_for_status()
+        load_duration = response.json().get("load_duration")
+        return load_duration / 1e9 if load_duration is not None else None
+
+    async def _ping(self) -> None:
+        """A one-token completion through the same client agent requests use."""
+        await self.llm.client.chat.completions.create(
+            model=self.llm.model,
+            messages=[{"role": "user", "content": "Hi"}],
+            max_tokens=1,
+            temperature=0,
+        )
+
+
+# (base_url, model, event loop) -> warmer; profiles sharing a model share its warm-up
+_warmers: Dict[Tuple[str, str, Optional[asyncio.AbstractEventLoop]], ModelWarmer] = {}
+_warmers_lock = threading.Lock()
+
+
+def get_warmer(llm: "LLM", **settings) -> ModelWarmer:
+    """
+    Get the warmer of llm's endpoint and model on the running event loop.
+
+    The first profile to register a model decides its keep-alive settings.
+
+    Args:
+        llm: The LLM whose client is used for warm-up requests
+        **settings: keep_alive and keep_alive_interval for ModelWarmer
+
+    Returns:
+        The ModelWarmer for this endpoint and model
+    """
+    key = (llm.base_url.rstrip("/"), llm.model, running_loop())
+    with _warmers_lock:
+        for stale in [k for k in _warmers if k[2] is not None and k[2].is_closed()]:
+            del _warmers[stale]
+        if key not in _warmers:
+            _warmers[key] = ModelWarmer(llm, **settings)
+        return _warmers[key]
+
+
+async def close_warmer(base_url: str, model: str) -> None:
+    """Stop the keep-alive loop of a model on the running event loop."""
+    with _warmers_lock:
+        warmer = _warmers.pop((base_url.rstrip("/"), model, running_loop()), None)
+    if warmer is not None:
+        await warmer.aclose()
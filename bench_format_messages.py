@@ -0,0 +1,72 @@
+"""Microbenchmark: per-step cost of preparing a request as history grows.
+
+Simulates an agent loop that appends one message per step and, every step,
+formats the whole history and counts its tokens, as LLM._prepare_messages
+does. Compares the cached wire dicts and token counts (to_wire, token_count)
+with rebuilding every dict (to_dict) and recounting every message.
+
+    python bench_format_messages.py [steps]
+"""
+import sys
+import time
+
+from app.llm import LLM
+from app.schema import Message, ToolCall
+from app.token_counter import TokenCounter
+
+
+counter = TokenCounter()
+
+
+def make_message(i: int) -> Message:
+    if i % 3 == 0:
+        return Message.user_message(f"step {i}: " + "lorem ipsum " * 20)
+    if i % 3 == 1:
+        call = ToolCall(
+            id=f"call_{i}",
+            function={"name": "python_execute", "arguments": '{"code": "print(1)"}'},
+        )
+        return Message.from_tool_calls([call], content=f"thinking {i}")
+    return Message.tool_message(
+        "output " * 30, name="python_execute", tool_call_id=f"call_{i}"
+    )
+
+
+def prepare_cached(messages):
+    formatted = LLM.format_messages(messages)
+    return counter.fit(formatted, counts=[m.token_count(counter) for m in messages])
+
+
+def prepare_uncached(messages):
+    return counter.fit([m.to_dict() for m in messages])
+
+
+def run(steps: int) -> None:
+    history = []
+    report_every = max(steps // 10, 1)
+    cached_total = uncached_total = 0.0
+    print(f"{'history':>8} {'cached us/step':>15} {'uncached us/step':>17}")
+    for step in range(1, steps + 1):
+        history.append(make_message(step))
+
+        start = time.perf_counter()
+        prepare_cached(history)
+        cached = time.perf_counter() - start
+
+        start = time.perf_counter()
+        prepare_uncached(history)
+        uncached = time.perf_counter() - start
+
+        cached_total += cached
+        uncached_total += uncached
+        if step % report_every == 0:
+            print(f"{step:>8} {cached * 1e6:>15.1f} {uncached * 1e6:>17.1f}")
+    print(
+        f"total: cached {cached_total * 1e3:.1f}ms, "
+        f"uncached {uncached_total * 1e3:.1f}ms "
+        f"({uncached_total / cached_total:.1f}x)"
+    )
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -5,6 +5,7 @@ from app.agent.manus import Manus
 from app.flow.base import FlowType
 from app.flow.flow_factory import FlowFactory
 from app.logger import logger
+from app.runtime import shutdown
 
 
 async def run_flow():
@@ -44,6 +45,8 @@ async def run_flow():
         logger.info("Operation cancelled by user.")
     except Exception as e:
         logger.error(f"Error: {str(e)}")
+    finally:
+        await shutdown("metrics_flow")
 
 
 if __name__ == "__main__":
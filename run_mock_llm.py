@@ -0,0 +1,49 @@
+import argparse
+
+import uvicorn
+
+from app.logger import logger
+from app.mock_llm import MockLLMServer, MockScript, create_app
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve a mock OpenAI-compatible chat-completions API"
+    )
+    parser.add_argument("--script", help="YAML or JSON file of scripted responses")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ttft", type=float, help="Seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, help="Generation speed")
+    parser.add_argument("--rate-limit-rate", type=float, help="Fraction of 429 replies")
+    parser.add_argument(
+        "--server-error-rate", type=float, help="Fraction of 500 replies"
+    )
+    parser.add_argument(
+        "--timeout-rate", type=float, help="Fraction of hanging replies"
+    )
+    parser.add_argument("--seed", type=int, help="Seed for the error injection")
+    args = parser.parse_args()
+
+    script = MockScript.load(args.script) if args.script else MockScript()
+    for name in (
+        "ttft",
+        "tokens_per_second",
+        "rate_limit_rate",
+        "server_error_rate",
+        "timeout_rate",
+        "seed",
+    ):
+        value = getattr(args, name)
+        if value is not None:
+            setattr(script.settings, name, value)
+
+    logger.info(
+        f"Mock LLM serving {len(script.responses)} scripted responses on "
+        f"http://{args.host}:{args.port}/v1"
+    )
+    uvicorn.run(create_app(MockLLMServer(script)), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()